@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import zipfile
+
+'''
+Загрузка архива с данными: потоково во временный файл <file_name>.part,
+с продолжением прерванной загрузки (HTTP Range), проверкой архива и
+необязательной проверкой SHA-256, затем атомарное переименование.
+source - URL (http/https), file:// URL или путь к локальному файлу (зеркало).
+Рядом с .part в <file_name>.part.info хранятся источник и его версия
+(ETag/Last-Modified или размер и время изменения файла): загрузка
+продолжается, только если они не изменились, иначе начинается заново.
+'''
+
+CHUNK_SIZE = 1 << 16
+
+
+# progress(done, total) вызывается после каждой порции, total может быть None;
+# cancelled() - загрузка прерывается, если возвращает True (.part сохраняется)
+def fetch_archive(source, file_name, progress=None, sha256=None, cancelled=None):
+    part_name = file_name + '.part'
+    info_name = part_name + '.info'
+    info = _read_info(info_name)
+    if os.path.exists(part_name) and info.get('source') == source:
+        offset = os.path.getsize(part_name)
+    else:
+        offset = 0
+        info = {'source': source}
+
+    if source.startswith('file://'):
+        source = source[len('file://'):]
+    if os.path.exists(source):
+        _copy_file(source, part_name, offset, info, info_name, progress, cancelled)
+    else:
+        _download(source, part_name, offset, info, info_name, progress, cancelled)
+
+    if sha256:
+        digest = hashlib.sha256()
+        with open(part_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest().lower() != sha256.strip().lower():
+            _discard(part_name, info_name)
+            raise Exception('Контрольная сумма не совпадает.')
+    # is_zipfile проверяет только конец архива, testzip - CRC всех файлов
+    try:
+        with zipfile.ZipFile(part_name) as archive:
+            damaged = archive.testzip()
+    except zipfile.BadZipFile:
+        _discard(part_name, info_name)
+        raise Exception('Загруженный файл не является zip-архивом.')
+    if damaged is not None:
+        _discard(part_name, info_name)
+        raise Exception('Загруженный архив поврежден: ' + damaged)
+    os.replace(part_name, file_name)
+    os.remove(info_name)
+
+
+def _read_info(info_name):
+    try:
+        with open(info_name, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_info(info_name, info):
+    with open(info_name, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+
+
+def _discard(part_name, info_name):
+    for name in (part_name, info_name):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _copy_file(source, part_name, offset, info, info_name, progress, cancelled):
+    st = os.stat(source)
+    total = st.st_size
+    validator = '{0}:{1}'.format(st.st_size, st.st_mtime_ns)
+    if offset > total or info.get('validator') != validator:
+        offset = 0
+    _write_info(info_name, dict(info, validator=validator))
+    with open(source, 'rb') as src, open(part_name, 'ab' if offset else 'wb') as dst:
+        src.seek(offset)
+        _copy_chunks(iter(lambda: src.read(CHUNK_SIZE), b''), dst,
+                     offset, total, progress, cancelled)
+
+
+# версия ресурса для If-Range: ETag (только сильный) или Last-Modified
+def _validator(headers):
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def _download(url, part_name, offset, info, info_name, progress, cancelled):
+    import requests
+
+    validator = info.get('validator')
+    # без сохраненной версии нельзя проверить, что .part от того же архива
+    if not validator:
+        offset = 0
+    headers = {'Range': 'bytes={0}-'.format(offset), 'If-Range': validator} if offset else {}
+    with requests.get(url, headers=headers, stream=True,
+                      allow_redirects=True, timeout=30) as r:
+        # уже загруженная часть - весь файл
+        if offset and r.status_code == 416:
+            return
+        # сервер без поддержки If-Range отдал часть уже другой версии архива
+        if offset and r.status_code == 206 and _validator(r.headers) != validator:
+            info.pop('validator')
+            r.close()
+            return _download(url, part_name, 0, info, info_name, progress, cancelled)
+        if offset and r.status_code == 206:
+            mode = 'ab'
+        elif r.status_code == 200:
+            # архив изменился или сервер не поддерживает Range, загрузка с начала
+            offset, mode = 0, 'wb'
+        else:
+            raise Exception('Невозможно скачать архив (HTTP {0}).'.format(r.status_code))
+        _write_info(info_name, dict(info, validator=_validator(r.headers)))
+        length = r.headers.get('Content-Length')
+        total = offset + int(length) if length is not None else None
+        with open(part_name, mode) as dst:
+            _copy_chunks(r.iter_content(CHUNK_SIZE), dst,
+                         offset, total, progress, cancelled)
+
+
+def _copy_chunks(chunks, dst, done, total, progress, cancelled):
+    for chunk in chunks:
+        if cancelled is not None and cancelled():
+            raise Exception('Загрузка прервана.')
+        dst.write(chunk)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
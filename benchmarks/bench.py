@@ -0,0 +1,177 @@
+#! /usr/bin/python3
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_loader import UnicodeTable  # noqa: E402
+from fixture import make_data_zip  # noqa: E402
+
+'''
+Тесты производительности: загрузка таблиц (с кэшем и без), режимы поиска
+UnicodeTable, заполнение результатов в UnicodeSearch и отрисовка
+CharacterWidget при прокрутке всей таблицы (Qt в режиме offscreen).
+Работают на синтетическом архиве из fixture.py, результаты выводятся в JSON;
+--compare сравнивает их с сохраненными ранее.
+
+    python benchmarks/bench.py --output before.json
+    python benchmarks/bench.py --compare before.json
+'''
+
+LANGS = ['ru', 'en']
+QUERIES = {
+    'find_block_name': ['', 'block 1', 'block 1f6', 'zz'],
+    'find_symbol_name': ['letter', 'arrow', 'cjk unified', 'with stroke', 'xyzzy'],
+    'find_symbols': ['Hello, world!', 'Привет, мир! ☺', ''.join(map(chr, range(0x2190, 0x2290)))],
+    'rank_symbol_name': ['arrow', 'letter small', 'arrow double left', 'a'],
+    'find_codes': ['41 416 1F600 E0041', ' '.join('{:X}'.format(c) for c in range(0x2000, 0x2400))],
+}
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'repeat': repeat, 'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times)}
+
+
+def bench_load(zip_name, repeat):
+    results = {}
+    for lang in LANGS:
+        def cold():
+            for cache_name in glob.glob('*.cache'):
+                os.remove(cache_name)
+            UnicodeTable(zip_name, lang)
+        results['load.{0}.cold'.format(lang)] = measure(cold, repeat)
+        results['load.{0}.warm'.format(lang)] = measure(
+            lambda: UnicodeTable(zip_name, lang), repeat)
+    return results
+
+
+def bench_search(zip_name, repeat):
+    results = {}
+    # индекс названий строится вместе с кэшем и входит в load.*.cold
+    table = UnicodeTable(zip_name, 'en')
+    for method, queries in QUERIES.items():
+        for i, query in enumerate(queries):
+            if method == 'find_codes':
+                fn = (lambda q: lambda: table.find_codes(q, 16))(query)
+            else:
+                fn = (lambda m, q: lambda: getattr(table, m)(q))(method, query)
+            results['search.{0}.{1}'.format(method, i)] = measure(fn, repeat)
+    text = ''.join(QUERIES['find_symbols']) * 1000
+    results['search.analyze_text'] = measure(lambda: list(table.analyze_text(text)), repeat)
+    return results
+
+
+def bench_gui(repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return {}
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    import main
+    from search_dialog import UnicodeSearch
+    window = main.Main()
+    window.show()
+    while window.table is None:
+        app.processEvents()
+
+    results = {}
+    dialog = UnicodeSearch(window)
+    dialog.search_mode.setCurrentIndex(1)
+
+    def search():
+        dialog.searchClicked()
+        while dialog.worker is not None:
+            app.processEvents()
+    dialog.combo.setCurrentText('abc')
+    search()
+    for query in ['letter', 'arrow']:
+        dialog.combo.setCurrentText(query)
+        results['dialog.searchClicked.' + query] = measure(search, repeat)
+    dialog.close()
+
+    chars = window.chars
+    scroll_bar = window.scroll_area.verticalScrollBar()
+    step = window.scroll_area.viewport().height()
+
+    def scroll():
+        for value in range(0, scroll_bar.maximum() + 1, step):
+            scroll_bar.setValue(value)
+            chars.repaint()
+    for compact in (False, True):
+        window.setCompact(compact)
+        name = 'paint.scroll.' + ('compact' if compact else 'full')
+        chars.glyph_codes = None
+        chars.updateLayout()
+        results[name + '.cold'] = measure(scroll, 1)
+        results[name + '.warm'] = measure(scroll, repeat)
+    window.close()
+    return results
+
+
+def compare(results, baseline_name):
+    with open(baseline_name) as f:
+        baseline = json.load(f)['results']
+    for name, result in sorted(results.items()):
+        if name in baseline:
+            old, new = baseline[name]['median'], result['median']
+            print('{0:45} {1:10.4f} -> {2:10.4f} s  x{3:.2f}'.format(
+                name, old, new, old / new if new else float('inf')), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='qUnicoder benchmarks')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='файл для результатов в JSON (по умолчанию stdout)')
+    parser.add_argument('--compare', help='JSON с результатами предыдущего запуска')
+    parser.add_argument('--no-gui', action='store_true', help='без тестов Qt')
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            zip_name = make_data_zip('unicode-table-data-master.zip')
+            results = {}
+            results.update(bench_load(zip_name, args.repeat))
+            results.update(bench_search(zip_name, args.repeat))
+            if not args.no_gui:
+                results.update(bench_gui(args.repeat))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'unidata_version': unicodedata.unidata_version,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#! /usr/bin/python3
+
+import http.server
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from archive_fetch import fetch_archive  # noqa: E402
+from fixture import make_data_zip  # noqa: E402
+
+'''
+Проверка fetch_archive на локальном HTTP-сервере, без сети: первая загрузка
+обрывается на середине, затем проверяется продолжение (206), смена версии
+архива при поддержке If-Range, сервер без поддержки Range (200) и отказ от
+.part, склеенного из двух версий, если сервер отдает прежний ETag.
+
+    python benchmarks/fetch_check.py
+'''
+
+
+class ArchiveHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        data = state['data']
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and state['ranges'] and self.headers.get('If-Range') == state['etag']:
+            start = int(match.group(1))
+        body = data[start:]
+        status = 206 if start else 200
+        state['statuses'].append(status)
+        self.send_response(status)
+        self.send_header('ETag', state['etag'])
+        self.send_header('Content-Length', str(len(body)))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, len(data) - 1, len(data)))
+        self.end_headers()
+        # обрыв соединения на середине ответа
+        if state['cut']:
+            state['cut'] = False
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body)
+
+
+# первая загрузка обрывается, .part остается; change() меняет сервер перед
+# повторной загрузкой, которая должна дать expected (None - отказ от архива)
+def check(server, url, file_name, first, change, expected, statuses):
+    for name in (file_name, file_name + '.part', file_name + '.part.info'):
+        if os.path.exists(name):
+            os.remove(name)
+    server.state.update(data=first, etag='"1"', ranges=True, cut=True, statuses=[])
+    try:
+        fetch_archive(url, file_name)
+    except Exception:
+        pass
+    else:
+        return 'прерванная загрузка завершилась'
+    # иначе продолжать нечего и проверялась бы только загрузка с начала
+    if not os.path.exists(file_name + '.part') or not os.path.getsize(file_name + '.part'):
+        return 'нет .part после обрыва'
+    change(server.state)
+    try:
+        fetch_archive(url, file_name)
+    except Exception as e:
+        if expected is not None:
+            return 'ошибка: {0}'.format(e)
+        if os.path.exists(file_name) or os.path.exists(file_name + '.part'):
+            return 'испорченный архив не удален'
+    else:
+        if expected is None:
+            return 'склеенный архив принят'
+        with open(file_name, 'rb') as f:
+            if f.read() != expected:
+                return 'содержимое не совпадает'
+    if server.state['statuses'] != statuses:
+        return 'ответы сервера {0}, ожидались {1}'.format(server.state['statuses'], statuses)
+    return None
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archives = []
+        for name, last_code in (('old.zip', 0xFFFF), ('new.zip', 0x1FFFF)):
+            with open(make_data_zip(os.path.join(tmp_dir, name), ('en',), last_code), 'rb') as f:
+                archives.append(f.read())
+        old, new = archives
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+        server.state = {}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{0}/data.zip'.format(server.server_address[1])
+        file_name = os.path.join(tmp_dir, 'data.zip')
+
+        cases = [
+            ('resume', lambda state: None, old, [200, 206]),
+            ('changed validator', lambda state: state.update(data=new, etag='"2"'),
+             new, [200, 200]),
+            ('range ignored', lambda state: state.update(ranges=False), old, [200, 200]),
+            ('spliced part', lambda state: state.update(data=new), None, [200, 206]),
+        ]
+        failed = 0
+        for name, change, expected, statuses in cases:
+            error = check(server, url, file_name, old, change, expected, statuses)
+            print('{0:20} {1}'.format(name, error or 'ok'))
+            failed += error is not None
+        server.shutdown()
+        server.server_close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
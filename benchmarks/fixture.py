@@ -0,0 +1,33 @@
+import unicodedata
+from zipfile import ZipFile, ZIP_DEFLATED
+
+'''
+Синтетический архив в формате unicode-table-data для тестов производительности
+без сети: разделы по BLOCK_SIZE кодов во всем диапазоне юникода, названия
+символов из unicodedata, для 'ru' - с префиксом, чтобы названия различались.
+'''
+
+DATA_ROOT = 'unicode-table-data-master'
+BLOCK_SIZE = 0x100
+
+
+def make_data_zip(file_name, langs=('ru', 'en'), last_code=0x10FFFF):
+    blocks = [('Block {:04X}'.format(first), first, min(first + BLOCK_SIZE - 1, last_code))
+              for first in range(0, last_code + 1, BLOCK_SIZE)]
+    with ZipFile(file_name, 'w', ZIP_DEFLATED) as z:
+        z.writestr(DATA_ROOT + '/data/blocks.txt', ''.join(
+            '[{0}]\n  diap: {1:04X}:{2:04X}\n\n'.format(*block) for block in blocks))
+        for lang in langs:
+            prefix = '' if lang == 'en' else lang + ' '
+            z.writestr(DATA_ROOT + '/loc/{0}/blocks.txt'.format(lang), ''.join(
+                '{0}: {1}{0}\n'.format(block[0], prefix) for block in blocks))
+            for block_name, first, last in blocks:
+                lines = []
+                for code in range(first, last + 1):
+                    name = unicodedata.name(chr(code), '')
+                    if name:
+                        lines.append('{0:04X}: {1}{2}\n'.format(code, prefix, name))
+                if lines:
+                    z.writestr(DATA_ROOT + '/loc/{0}/symbols/{1:04X}.txt'.format(lang, first),
+                               ''.join(lines))
+    return file_name
@@ -1,12 +1,21 @@
-from PyQt5.QtCore import pyqtSignal, QSize, Qt
+from array import array
+from bisect import bisect_left
+from PyQt5.QtCore import pyqtSignal, QRect, QSize, Qt
 from PyQt5.QtGui import QFontMetrics, QPainter
 from PyQt5.QtWidgets import QToolTip, QWidget
+from instrument import span
 
 
 class CharacterWidget(QWidget):
 
     characterSelected = pyqtSignal(str)
 
+    # показываются коды меньше CODE_LIMIT
+    CODE_LIMIT = 0x110000
+
+    # смещение глифа еще не измерено
+    NOT_MEASURED = -0x8000
+
     def __init__(self, parent):
         super(CharacterWidget, self).__init__(parent)
         self.parent = parent
@@ -16,6 +25,12 @@ class CharacterWidget(QWidget):
         self.lastKey = -1
         self.currentKey = -1
         self.pressedKey = None
+        # компактный вид: показываются только строки с назначенными символами,
+        # row_index[видимая строка] = номер строки полной таблицы
+        self.compact = False
+        self.row_index = None
+        # GlyphCoverage шрифта, символы без глифа рисуются бледно
+        self.coverage = None
         self.setMouseTracking(True)
         self.setStyleSheet('''
             QToolTip {
@@ -27,84 +42,179 @@ class CharacterWidget(QWidget):
 
         self.fontMetrics = QFontMetrics(self.parent.big_font)
 
+        # смещения глифов от левого края ячейки для big_font по позициям
+        # в glyph_codes (assigned_codes() таблицы), размер ограничен числом кодов
+        self.glyph_codes = None
+        self.glyph_offsets = array('h')
+
     def sizeHint(self):
         return QSize(self.columns * self.cell_size,
-                     (131072 / self.columns) * self.cell_size)
+                     self.rowCount() * self.cell_size)
+
+    # пересчитать индекс строк после смены таблицы или вида
+    def updateLayout(self):
+        self.row_index = None
+        if self.parent.table is not None:
+            codes = self.parent.table.assigned_codes()
+            # у языков назначенные коды общие, измеренное остается
+            if codes is not self.glyph_codes:
+                self.glyph_codes = codes
+                self.glyph_offsets = array('h', [self.NOT_MEASURED]) * len(codes)
+        if self.compact and self.parent.table is not None:
+            rows = {code // self.columns for code in self.parent.table.assigned_codes()
+                    if code < self.CODE_LIMIT}
+            self.row_index = array('I', sorted(rows))
+        self.resize(self.sizeHint())
+        self.update()
+
+    def rowCount(self):
+        if self.row_index is None:
+            return self.CODE_LIMIT // self.columns
+        return len(self.row_index)
+
+    # первый код в видимой строке row
+    def rowStart(self, row):
+        if self.row_index is None:
+            return row * self.columns
+        if not self.row_index:
+            return 0
+        return self.row_index[max(0, min(row, len(self.row_index) - 1))] * self.columns
+
+    # видимая строка с кодом code, для скрытых строк - ближайшая следующая
+    def rowForCode(self, code):
+        if self.row_index is None:
+            return code // self.columns
+        row = bisect_left(self.row_index, code // self.columns)
+        return max(0, min(row, len(self.row_index) - 1))
+
+    # код в точке (x, y) виджета или -1
+    def keyAt(self, x, y):
+        row = y // self.cell_size
+        column = x // self.cell_size
+        if row < 0 or row >= self.rowCount() or column < 0 or column >= self.columns:
+            return -1
+        return self.rowStart(row) + column
+
+    def cellRect(self, key):
+        return QRect((key % self.columns) * self.cell_size,
+                     self.rowForCode(key) * self.cell_size,
+                     self.cell_size + 1, self.cell_size + 1)
+
+    # перерисовать только одну ячейку вместо всего виджета
+    def updateCell(self, key):
+        if key is not None and key >= 0:
+            self.update(self.cellRect(key))
+
+    def setCoverage(self, coverage):
+        self.coverage = coverage
+        self.update()
+
+    # смещение глифа key_ch с позицией i в glyph_codes от левого края ячейки,
+    # ширина измеряется один раз
+    def glyphOffset(self, i, key_ch):
+        offset = self.glyph_offsets[i]
+        if offset == self.NOT_MEASURED:
+            offset = (self.cell_size - self.fontMetrics.width(key_ch)) // 2
+            self.glyph_offsets[i] = max(offset, self.NOT_MEASURED + 1)
+        return offset
 
     def mouseMoveEvent(self, event):
         if self.pressedKey:
             return
         widgetPosition = self.mapFromGlobal(event.globalPos())
-        self.currentKey = (widgetPosition.y() // self.cell_size) * \
-            self.columns + widgetPosition.x() // self.cell_size
+        self.currentKey = self.keyAt(widgetPosition.x(), widgetPosition.y())
 
         if self.currentKey != self.lastKey:
+            self.updateCell(self.lastKey)
             self.lastKey = self.currentKey
-            name = self.parent.table._symbol_list[self.currentKey]
-            if name == "no info":
+            if not self.parent.table.is_assigned(self.currentKey):
                 QToolTip.hideText()
             else:
+                name = self.parent.table.get_name(self.currentKey)
                 info_str = ('<i style="text-align:center">{0}</i>'
                             '<pre style="text-align:center">Hex: {1:04X} | Dec: {1}</pre>'
                             '<p style="font-size:48px;text-align:center">{2}</p>').format(
                     name, self.currentKey, chr(self.currentKey))
                 # info_str = '{0}\nU+{1:04X} | Dec:{1}'.format(name, self.currentKey)
                 QToolTip.showText(event.globalPos(), info_str, self)
-            self.update()
+            self.updateCell(self.currentKey)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            key_ch = chr(self.lastKey)
-            if self.parent.table._symbol_list[self.currentKey] != "no info":
+            if self.parent.table.is_assigned(self.currentKey):
                 self.pressedKey = self.currentKey
-                self.characterSelected.emit(key_ch)
-            self.update()
+                self.characterSelected.emit(chr(self.currentKey))
+            self.updateCell(self.currentKey)
         else:
             super(CharacterWidget, self).mousePressEvent(event)
 
     def mouseReleaseEvent(self, event):
-        self.currentKey = (event.y() // self.cell_size) * \
-            self.columns + event.x() // self.cell_size
+        self.updateCell(self.pressedKey)
+        self.updateCell(self.currentKey)
+        self.currentKey = self.keyAt(event.x(), event.y())
         self.pressedKey = None
-        self.update()
+        self.updateCell(self.currentKey)
 
     def paintEvent(self, event):
+        with span('paint', rect=event.rect().getRect()):
+            self.paintCells(event)
+
+    def paintCells(self, event):
         painter = QPainter(self)
         painter.fillRect(event.rect(), Qt.white)
+        # таблица еще загружается
+        if self.parent.table is None:
+            return
         painter.setFont(self.parent.big_font)
+        codes = self.glyph_codes
+        size = self.cell_size
+        baseline = 6 + self.fontMetrics.ascent()
 
         redrawRect = event.rect()
-        beginRow = redrawRect.top() // self.cell_size
-        endRow = redrawRect.bottom() // self.cell_size
-        beginColumn = redrawRect.left() // self.cell_size
-        endColumn = redrawRect.right() // self.cell_size
-
+        beginRow = redrawRect.top() // size
+        endRow = min(redrawRect.bottom() // size, self.rowCount() - 1)
+        beginColumn = redrawRect.left() // size
+        endColumn = min(redrawRect.right() // size, self.columns - 1)
+
+        # рамки назначенных символов; коды строки перебираются по assigned_codes,
+        # без проверки каждой ячейки
+        cells = []
+        painter.setPen(Qt.lightGray)
         for row in range(beginRow, endRow + 1):
-            for column in range(beginColumn, endColumn + 1):
-                key = row * self.columns + column
+            rowStart = self.rowStart(row)
+            last = rowStart + endColumn
+            y = row * size
+            i = bisect_left(codes, rowStart + beginColumn)
+            while i < len(codes) and codes[i] <= last:
+                key = codes[i]
+                x = (key - rowStart) * size
+                painter.drawRect(x, y, size, size)
+                cells.append((key, i, x, y))
+                i += 1
+
+        # символы, перо меняется только между группами
+        missing = []
+        selected = []
+        painter.setPen(Qt.black)
+        for cell in cells:
+            key, i, x, y = cell
+            if key == self.pressedKey or key == self.currentKey:
+                selected.append(cell)
+            elif self.coverage is not None and not self.coverage.supports(key):
+                missing.append(cell)
+            else:
                 key_ch = chr(key)
-                if self.parent.table._symbol_list[key] == "no info":
-                    continue
-
-                x, y = column * self.cell_size, row * self.cell_size
-
-                painter.setPen(Qt.lightGray)
-                painter.drawRect(x, y, self.cell_size, self.cell_size)
-
-                if key == self.currentKey:
-                    painter.fillRect(x + 1, y + 1, self.cell_size - 1,
-                                     self.cell_size - 1, self.color_hl)
-
-                if key == self.pressedKey:
-                    painter.fillRect(x + 1, y + 1, self.cell_size,
-                                     self.cell_size, Qt.black)
-
-                    painter.setPen(self.color_hl)
-                    painter.drawText(
-                        x + (self.cell_size - self.fontMetrics.width(key_ch)) / 2,
-                        y + 6 + self.fontMetrics.ascent(), key_ch)
-                else:
-                    painter.setPen(Qt.black)
-                    painter.drawText(
-                        x + (self.cell_size - self.fontMetrics.width(key_ch)) / 2,
-                        y + 6 + self.fontMetrics.ascent(), key_ch)
+                painter.drawText(x + self.glyphOffset(i, key_ch), y + baseline, key_ch)
+        painter.setPen(Qt.lightGray)
+        for key, i, x, y in missing:
+            key_ch = chr(key)
+            painter.drawText(x + self.glyphOffset(i, key_ch), y + baseline, key_ch)
+        for key, i, x, y in selected:
+            if key == self.pressedKey:
+                background, pen = Qt.black, self.color_hl
+            else:
+                background, pen = self.color_hl, Qt.black
+            painter.fillRect(x + 1, y + 1, size - 1, size - 1, background)
+            painter.setPen(pen)
+            key_ch = chr(key)
+            painter.drawText(x + self.glyphOffset(i, key_ch), y + baseline, key_ch)
@@ -1,17 +1,162 @@
 import re
 import os
+import hashlib
 from zipfile import ZipFile
 from io import TextIOWrapper
 import pickle
+import mmap
+import struct
+import tempfile
+import sys
+import threading
+import heapq
+from instrument import log, span
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
 
 '''
 Settings загружает или сохраняет в файл <appname>.pickle
 1. закладки
 2. текущий язык
 3. набранный текст
+4. компактный вид таблицы символов
 '''
 
 
+# ключ кэша: размер, время изменения и хэш архива с данными
+def archive_key(file_name):
+    st = os.stat(file_name)
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return (st.st_size, st.st_mtime_ns, digest.hexdigest())
+
+
+# часть таблицы: (коды по возрастанию, смещения, названия), название codes[k] -
+# names[offsets[k]:offsets[k + 1] - 1] в UTF-8, после каждого названия '\n';
+# symbols - {код: название в UTF-8}
+def make_part(symbols):
+    codes = array('I', sorted(symbols))
+    offsets = array('I', [0])
+    names = bytearray()
+    for code in codes:
+        names += symbols[code]
+        names += b'\n'
+        offsets.append(len(names))
+    return codes, offsets, bytes(names)
+
+
+# разбор файлов с названиями символов из архива, names - имена файлов в архиве;
+# результат: имя файла -> часть таблицы (make_part) с его символами;
+# функция уровня модуля, чтобы ее можно было передать в пул процессов
+def parse_symbols(file_name, names):
+    parts = {}
+    with ZipFile(file_name) as utdata_zip:
+        for name in names:
+            symbols = {}
+            with utdata_zip.open(name) as f:
+                f = TextIOWrapper(f, encoding='utf-8')
+                # (hex_code, localized_symbol_name)
+                for s in re.findall(r'([0-9A-F]{4,6}): (.+)', f.read()):
+                    symbols[int(s[0], 16)] = s[1].encode('utf-8')
+            parts[name] = make_part(symbols)
+    return parts
+
+
+# триграмма в виде числа: три кода по 21 бит
+def trigram_key(gram):
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+# триграммный индекс названий символов в разделах ranges для таблицы (codes,
+# offsets, names): (ключи триграмм по возрастанию, смещения, коды) - коды
+# символов с k-й триграммой в названии (в нижнем регистре) -
+# postings[gram_offsets[k]:gram_offsets[k + 1]], по возрастанию.
+# Индекс по кодам, а не по позициям в таблице, поэтому при обновлении архива
+# он не зависит от сдвига позиций и пересчитывается только для изменившихся файлов
+def build_name_index(codes, offsets, names, ranges):
+    trigrams = {}
+    for first, last, block_name in ranges:
+        begin, end = bisect_left(codes, first), bisect_right(codes, last)
+        lower_names = str(names[offsets[begin]:offsets[end]], 'utf-8').lower().split('\n')
+        for code, lower in zip(codes[begin:end], lower_names):
+            for gram in {lower[j:j + 3] for j in range(len(lower) - 2)}:
+                posting = trigrams.get(gram)
+                if posting is None:
+                    posting = trigrams[gram] = array('I')
+                posting.append(code)
+    gram_keys = array('Q')
+    gram_offsets = array('I', [0])
+    postings = array('I')
+    for key, gram in sorted((trigram_key(gram), gram) for gram in trigrams):
+        gram_keys.append(key)
+        postings.extend(trigrams[gram])
+        gram_offsets.append(len(postings))
+    return gram_keys, gram_offsets, postings
+
+
+# возрастающая последовательность uint32 (array или memoryview) как байты
+def _as_bytes(sequence):
+    return memoryview(sequence).cast('B')
+
+
+# слияние возрастающих последовательностей кодов a и b без общих элементов
+# в массив out; куски между точками чередования копируются целиком
+def _merge_postings(a, b, out):
+    i = j = 0
+    while j < len(b):
+        k = bisect_left(a, b[j], i)
+        out.frombytes(_as_bytes(a[i:k]))
+        i = k
+        m = bisect_left(b, a[i], j) if i < len(a) else len(b)
+        out.frombytes(_as_bytes(b[j:m]))
+        j = m
+    out.frombytes(_as_bytes(a[i:]))
+
+
+# индекс previous (build_name_index) без кодов из диапазонов removed
+# ((first, last) по возрастанию, не пересекаются) и с кодами из индекса added
+def update_name_index(previous, removed, added):
+    old_keys, old_offsets, old_postings = previous
+    new_keys, new_offsets, new_postings = added
+    old_index = {key: k for k, key in enumerate(old_keys)}
+    new_index = {key: k for k, key in enumerate(new_keys)}
+    gram_keys = array('Q')
+    gram_offsets = array('I', [0])
+    postings = array('I')
+    for key in sorted(old_index.keys() | new_index.keys()):
+        kept = array('I')
+        k = old_index.get(key)
+        if k is not None:
+            posting = old_postings[old_offsets[k]:old_offsets[k + 1]]
+            start = 0
+            for first, last in removed:
+                begin = bisect_left(posting, first, start)
+                kept.frombytes(_as_bytes(posting[start:begin]))
+                start = bisect_right(posting, last, begin)
+            kept.frombytes(_as_bytes(posting[start:]))
+        k = new_index.get(key)
+        if k is not None:
+            _merge_postings(kept, new_postings[new_offsets[k]:new_offsets[k + 1]], postings)
+        else:
+            postings.extend(kept)
+        if len(postings) > gram_offsets[-1]:
+            gram_keys.append(key)
+            gram_offsets.append(len(postings))
+    return gram_keys, gram_offsets, postings
+
+
+# число символов по разделам для строк UnicodeTable.analyze_text, по убыванию;
+# символы вне разделов учитываются под None
+def block_histogram(rows):
+    histogram = Counter()
+    for code, block_name, name, count in rows:
+        histogram[block_name] += count
+    return histogram.most_common()
+
+
 class Settings:
     def __init__(self, filename):
 
@@ -19,25 +164,28 @@ class Settings:
         self.bookmarks = []
         self.lang = 'ru'
         self.editstring = ''
+        self.compact = False
 
         self.filename = filename + '.pickle'
         if not os.path.exists(self.filename):
-            print('No saved settings found.')
+            log.info('No saved settings found.')
             return
         with open(self.filename, 'rb') as f:
             data = pickle.load(f)
             self.bookmarks = data['bookmarks']
             self.lang = data['lang']
             self.editstring = data['editstring']
-            print('{0} bookmarks loaded from "{1}", lang="{2}", editstring="{3}"'.format(
-                len(self.bookmarks), self.filename, self.lang, self.editstring))
+            self.compact = data.get('compact', False)
+            log.info('%d bookmarks loaded from "%s", lang="%s", editstring="%s"',
+                     len(self.bookmarks), self.filename, self.lang, self.editstring)
 
     def save(self):
         with open(self.filename, 'wb') as f:
             pickle.dump({
                 'bookmarks': self.bookmarks,
                 'lang': self.lang,
-                'editstring': self.editstring
+                'editstring': self.editstring,
+                'compact': self.compact
             }, f)
 
 
@@ -50,109 +198,639 @@ https://github.com/unicode-table/unicode-table-data/archive/master.zip
 
 class UnicodeTable:
 
-    def __init__(self, file_name, lang_str):
+    # версия формата кэша, увеличивается при любом изменении структуры данных
+    CACHE_VERSION = 9
+
+    # кэш: CACHE_MAGIC, длина заголовка (uint32 LE), заголовок в pickle
+    # (версия, ключ, CACHE_FIELDS и положение CACHE_ARRAYS в файле), затем массивы
+    # (порядок байт sys.byteorder): codes и offsets, названия в UTF-8
+    # и триграммный индекс названий (build_name_index).
+    # Файл открывается через mmap только для чтения, массивы используются на месте
+    # как memoryview, поэтому разные процессы и языки делят страницы в памяти.
+    # members (имя, CRC и положение символов файла в codes) и sources (CRC)
+    # позволяют после обновления архива разобрать только изменившиеся файлы
+    CACHE_MAGIC = b'QUTC'
+    CACHE_FIELDS = ('key', 'blocks', 'ranges', 'block_names', 'sources', 'members')
+    # имя массива -> тип элементов
+    CACHE_ARRAYS = OrderedDict((
+        ('codes', 'I'), ('offsets', 'I'), ('names', 'B'),
+        ('gram_keys', 'Q'), ('gram_offsets', 'I'), ('postings', 'I')))
+
+    # число файлов с символами в одной задаче для пула executor
+    PARSE_CHUNK = 16
+
+    # разделители слов в названиях символов для rank_symbol_name
+    WORD_SEPARATORS = re.compile(r'[ \-]')
+
+    # executor (пул процессов или потоков) используется для разбора архива,
+    # если кэша нет или он устарел
+    def __init__(self, file_name, lang_str, executor=None):
         self.lang = lang_str
         self.ok = False
         self.message = ''
-        DATA_ROOT = file_name.split('.')[0]
-
-        utdata_zip = ZipFile(file_name)
 
         self._no_info_str = "no info"
-        self._blocks = []
-        with utdata_zip.open(DATA_ROOT + '/data/blocks.txt') as f:
-            f = TextIOWrapper(f, encoding='utf-8')
-            self._blocks = re.findall(
-                r'\[(.*)\]\n\s*diap\s*:\s([0-9A-F]{4,5}):([0-9A-F]{4,5})', f.read())
-            # _blocks element: (block-name, first-hex-code, last-hex-code)
-        print('{0} ranges loaded from "{1}"'.format(
-            len(self._blocks), utdata_zip.filename))
-
-        self._table = {}
-        self._symbol_list = [self._no_info_str] * 0x100000
+
+        cache_name = '{0}.{1}.cache'.format(os.path.splitext(file_name)[0], lang_str)
+        with span('table.archive_key'):
+            key = archive_key(file_name)
+        with span('table.cache_read', lang=lang_str):
+            data = self._read_cache(cache_name)
+        if data is not None and data['key'] == key:
+            log.info('UnicodeTable "%s" data loaded from "%s"', lang_str, cache_name)
+        else:
+            if data is not None:
+                log.info('Outdated cache "%s"', cache_name)
+            # из устаревшего кэша берется то, что не изменилось в архиве
+            with span('table.parse', lang=lang_str):
+                data = self._parse(file_name, lang_str, executor, data)
+            with span('table.cache_write', lang=lang_str):
+                if self._write_cache(cache_name, key, data):
+                    # дальше работать с отображенным в память файлом, а не с копией
+                    data = self._read_cache(cache_name) or data
+
+        # _blocks element: (block-name, first-hex-code, last-hex-code)
+        self._blocks = data['blocks']
+        # названия символов: _codes - назначенные коды по возрастанию,
+        # название _codes[i] - _names[_offsets[i]:_offsets[i + 1] - 1] в UTF-8,
+        # названия разделены '\n', чтобы раздел можно было декодировать и разбить целиком
+        self._codes = data['codes']
+        self._offsets = data['offsets']
+        self._names = data['names']
+
+        # _block_ranges element: (first-code, last-code, block_name), по возрастанию
+        self._block_ranges = data['ranges']
+        self._block_starts = [r[0] for r in self._block_ranges]
+        # block_name -> (first-code, last-code, begin, end), [begin, end) - позиции в _codes
+        self._block_info = {}
+        for first, last, block_name in self._block_ranges:
+            self._block_info[block_name] = (
+                first, last,
+                bisect_left(self._codes, first), bisect_right(self._codes, last))
+
+        # триграммный индекс названий символов, см. build_name_index
+        self._gram_keys = data['gram_keys']
+        self._gram_offsets = data['gram_offsets']
+        self._postings = data['postings']
+        self.ok = True
+
+    # разбор архива: диапазоны, названия символов и разделов на языке lang_str.
+    # previous - данные устаревшего кэша или None; файлы архива, CRC которых
+    # совпадает с записанными в нем, повторно не разбираются
+    def _parse(self, file_name, lang_str, executor=None, previous=None):
+        DATA_ROOT = os.path.basename(file_name).split('.')[0]
+        blocks_member = DATA_ROOT + '/data/blocks.txt'
+        block_names_member = DATA_ROOT + '/loc/' + lang_str + '/blocks.txt'
+
+        with span('parse.zip_open', lang=lang_str):
+            utdata_zip = ZipFile(file_name)
+            crcs = {info.filename: info.CRC for info in utdata_zip.infolist()}
+
+        sources = previous['sources'] if previous is not None else {}
+
+        if sources.get(blocks_member) == crcs[blocks_member]:
+            blocks = previous['blocks']
+        else:
+            with span('parse.blocks', lang=lang_str):
+                with utdata_zip.open(blocks_member) as f:
+                    f = TextIOWrapper(f, encoding='utf-8')
+                    blocks = re.findall(
+                        r'\[(.*)\]\n\s*diap\s*:\s([0-9A-F]{4,6}):([0-9A-F]{4,6})', f.read())
+        log.info('%d ranges loaded from "%s"', len(blocks), utdata_zip.filename)
 
         target_str = '/loc/' + lang_str + '/symbols/'
-        for name in utdata_zip.namelist():
-            if (target_str in name) and (name[-1] != '/'):
-                with utdata_zip.open(name) as f:
+        members = [name for name in utdata_zip.namelist()
+                   if (target_str in name) and (name[-1] != '/')]
+        parts = self._unchanged_parts(previous, crcs) if previous is not None else {}
+        reused = set(parts)
+        changed = [name for name in members if name not in parts]
+        log.info('%d of %d symbol files changed in "%s"',
+                 len(changed), len(members), utdata_zip.filename)
+        # в архиве изменилось только время: данные прежние, меняется ключ
+        if (previous is not None and not changed
+                and len(reused) == len(previous['members'])
+                and all(sources.get(name) == crcs[name]
+                        for name in (blocks_member, block_names_member))):
+            utdata_zip.close()
+            return dict(previous)
+        with span('parse.symbols', lang=lang_str, members=len(changed)):
+            if executor is None:
+                parts.update(parse_symbols(file_name, changed))
+            else:
+                futures = [executor.submit(parse_symbols, file_name,
+                                           changed[i:i + self.PARSE_CHUNK])
+                           for i in range(0, len(changed), self.PARSE_CHUNK)]
+                for future in futures:
+                    parts.update(future.result())
+
+        if sources.get(block_names_member) == crcs[block_names_member]:
+            block_names = previous['block_names']
+        else:
+            block_names = {}
+            with span('parse.block_names', lang=lang_str):
+                with utdata_zip.open(block_names_member) as f:
                     f = TextIOWrapper(f, encoding='utf-8')
-                    symbols = re.findall(r'([0-9A-F]{4,5}): (.+)', f.read())
-                    # symbols: (hex_code, localized_symbol_name)
-                    for s in symbols:
-                        self._symbol_list[int(s[0], 16)] = s[1]
-
-        block_names = {}
-        with utdata_zip.open(DATA_ROOT + '/loc/' + lang_str + '/blocks.txt') as f:
-            f = TextIOWrapper(f, encoding='utf-8')
-            for pair in re.findall('(.*):(.*)', f.read()):
-                # pair: (block_name, localized_block_name)
-                block_names[pair[0].strip()] = pair[1].strip()
-
-        for block in self._blocks:
-            block_name = block_names[block[0]]
-            first = int(block[1], 16)
-            if first > 0x1FFFF:
-                continue
-            last = int(block[2], 16)
-            block_table = {}
-            for i in range(first, last + 1):
-                if self._symbol_list[i] != self._no_info_str:
-                    block_table[i] = self._symbol_list[i]
-            # no empty tables
-            if len(block_table) > 0:
-                self._table[block_name] = block_table
+                    for pair in re.findall('(.*):(.*)', f.read()):
+                        # pair: (block_name, localized_block_name)
+                        block_names[pair[0].strip()] = pair[1].strip()
+
+        with span('parse.build_table', lang=lang_str):
+            (codes, offsets, names), positions = self._join_parts(
+                [parts[name] for name in members])
+
+            ranges = []
+            for block in blocks:
+                block_name = block_names[block[0]]
+                first = int(block[1], 16)
+                last = int(block[2], 16)
+                # no empty tables
+                if bisect_left(codes, first) < bisect_right(codes, last):
+                    ranges.append((first, last, block_name))
+                else:
+                    log.debug('empty block: %s', block_name)
+            ranges.sort()
+        with span('parse.name_index', lang=lang_str, members=len(changed)):
+            # раздел тот же и положение символов каждого файла известно:
+            # индекс пересчитывается только для изменившихся файлов
+            if (previous is not None and blocks is previous['blocks']
+                    and all(begin is not None for name, crc, begin, end in previous['members'])
+                    and all(begin is not None for begin, end in positions)):
+                old_codes = previous['codes']
+                removed = sorted((old_codes[begin], old_codes[end - 1])
+                                 for name, crc, begin, end in previous['members']
+                                 if name not in reused and begin < end)
+                changed_codes, changed_offsets, changed_names = self._join_parts(
+                    [parts[name] for name in changed])[0]
+                gram_keys, gram_offsets, postings = update_name_index(
+                    (previous['gram_keys'], previous['gram_offsets'], previous['postings']),
+                    removed,
+                    build_name_index(changed_codes, changed_offsets, changed_names, ranges))
             else:
-                print('empty block: ', block_name)
-        print('UnicodeTable "{0}" data loaded from "{1}"'.format(
-            lang_str, utdata_zip.filename))
+                gram_keys, gram_offsets, postings = build_name_index(
+                    codes, offsets, names, ranges)
+        log.info('UnicodeTable "%s" data loaded from "%s"', lang_str, utdata_zip.filename)
         utdata_zip.close()
-        self.ok = True
+        sources = {name: crcs[name] for name in (blocks_member, block_names_member)}
+        return {'blocks': blocks, 'codes': codes, 'offsets': offsets,
+                'names': names, 'ranges': ranges, 'block_names': block_names,
+                'gram_keys': gram_keys, 'gram_offsets': gram_offsets, 'postings': postings,
+                'sources': sources,
+                'members': [(name, crcs[name]) + position
+                            for name, position in zip(members, positions)]}
+
+    # части таблицы устаревшего кэша previous для файлов архива с неизменной CRC,
+    # без копирования: срезы отображенного в память файла
+    def _unchanged_parts(self, previous, crcs):
+        parts = {}
+        for name, crc, begin, end in previous['members']:
+            if begin is not None and crcs.get(name) == crc:
+                parts[name] = (previous['codes'][begin:end],
+                               previous['offsets'][begin:end + 1], previous['names'])
+        return parts
+
+    # объединение частей таблицы parts (в порядке файлов архива) в одну.
+    # Если диапазоны кодов частей не пересекаются, они склеиваются в порядке кодов,
+    # и для каждой части возвращается ее положение (begin, end) в таблице.
+    # Иначе названия объединяются по кодам, как при разборе всего архива
+    # (остается название из последнего файла), и положения частей (None, None)
+    def _join_parts(self, parts):
+        order = sorted((i for i in range(len(parts)) if len(parts[i][0])),
+                       key=lambda i: parts[i][0][0])
+        if any(parts[i][0][-1] >= parts[j][0][0] for i, j in zip(order, order[1:])):
+            symbols = {}
+            for part_codes, part_offsets, part_names in parts:
+                for k, code in enumerate(part_codes):
+                    symbols[code] = part_names[part_offsets[k]:part_offsets[k + 1] - 1]
+            return make_part(symbols), [(None, None)] * len(parts)
+
+        codes = array('I')
+        offsets = array('I', [0])
+        names = bytearray()
+        positions = [(0, 0)] * len(parts)
+        for i in order:
+            part_codes, part_offsets, part_names = parts[i]
+            positions[i] = (len(codes), len(codes) + len(part_codes))
+            codes.frombytes(memoryview(part_codes).cast('B'))
+            shift = len(names) - part_offsets[0]
+            names += part_names[part_offsets[0]:part_offsets[-1]]
+            offsets.extend(offset + shift for offset in part_offsets[1:])
+        return (codes, offsets, bytes(names)), positions
+
+    # данные кэша без проверки ключа или None, если его нет или формат другой
+    def _read_cache(self, cache_name):
+        if not os.path.exists(cache_name):
+            return None
+        try:
+            with open(cache_name, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            # кэш в формате до версии 5 - pickle целиком
+            if view[:4] != self.CACHE_MAGIC:
+                log.info('Outdated cache "%s"', cache_name)
+                return None
+            header_len, = struct.unpack_from('<I', view, 4)
+            header = pickle.loads(view[8:8 + header_len])
+            if (header.get('version') != self.CACHE_VERSION
+                    or header.get('byteorder') != sys.byteorder):
+                log.info('Outdated cache "%s"', cache_name)
+                return None
+            data = {name: header[name] for name in self.CACHE_FIELDS}
+            for name, typecode in self.CACHE_ARRAYS.items():
+                start, end = header[name]
+                # обрезанный или испорченный файл
+                if not 8 + header_len <= start <= end <= len(mapped):
+                    raise ValueError('section "{0}" out of file bounds'.format(name))
+                data[name] = view[start:end].cast(typecode)
+        except Exception as e:
+            log.warning('Broken cache "%s": %s', cache_name, e)
+            return None
+        return data
+
+    # True, если кэш записан
+    def _write_cache(self, cache_name, key, data):
+        header = {name: data[name] for name in self.CACHE_FIELDS if name != 'key'}
+        header.update(version=self.CACHE_VERSION, key=key, byteorder=sys.byteorder)
+        # массивы, bytes или memoryview из устаревшего кэша - без лишнего копирования
+        sections = [_as_bytes(data[name]) for name in self.CACHE_ARRAYS]
+        # положения массивов зависят от длины заголовка, который их содержит:
+        # заголовок собирается заново, пока его длина не перестанет расти
+        header_len = 0
+        while True:
+            pos = 8 + header_len
+            # массивы выровнены по 8 байт (uint64 в gram_keys)
+            pos += -pos % 8
+            for name, section in zip(self.CACHE_ARRAYS, sections):
+                header[name] = (pos, pos + len(section))
+                pos += len(section)
+                pos += -pos % 8
+            packed = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+            if len(packed) <= header_len:
+                break
+            header_len = len(packed)
+        # у каждого процесса свой временный файл: общий мог бы переименовать
+        # другой процесс, пока этот еще пишет в него
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=os.path.basename(cache_name) + '.', suffix='.tmp',
+                dir=os.path.dirname(cache_name) or '.')
+            # mkstemp создает файл с правами 0600
+            os.chmod(tmp_name, 0o644)
+            with open(fd, 'wb') as f:
+                f.write(self.CACHE_MAGIC + struct.pack('<I', len(packed)))
+                f.write(packed)
+                for name, section in zip(self.CACHE_ARRAYS, sections):
+                    f.write(b'\0' * (header[name][0] - f.tell()))
+                    f.write(section)
+            os.replace(tmp_name, cache_name)
+        except OSError as e:
+            log.warning('Unable to write cache "%s": %s', cache_name, e)
+            if tmp_name is not None:
+                try:
+                    os.remove(tmp_name)
+                except OSError:
+                    pass
+            return False
+        return True
+
+    # позиция кода в _codes или -1
+    def _position(self, code):
+        i = bisect_left(self._codes, code)
+        if i < len(self._codes) and self._codes[i] == code:
+            return i
+        return -1
+
+    def _name_at(self, i):
+        return str(self._names[self._offsets[i]:self._offsets[i + 1] - 1], 'utf-8')
+
+    # названия символов на позициях begin..end - 1 одной строкой через '\n'
+    def _names_text(self, begin, end):
+        return str(self._names[self._offsets[begin]:self._offsets[end]], 'utf-8')
+
+    # позиции символов всех разделов в порядке возрастания кодов
+    def _table_positions(self):
+        for info in self._block_info.values():
+            yield from range(info[2], info[3])
+
+    # (раздел, позиция) для возрастающих позиций в разделах, раздел определяется
+    # по ходу перебора, без поиска для каждой позиции
+    def _with_blocks(self, positions):
+        blocks = iter(self._block_info.items())
+        block_name, info = next(blocks, (None, None))
+        for i in positions:
+            while info is not None and i >= info[3]:
+                block_name, info = next(blocks, (None, None))
+            yield block_name, i
+
+    def _entry_at(self, i):
+        code = self._codes[i]
+        return (self.block_for(code), code, self._name_at(i))
+
+    # назначенные коды по возрастанию (последовательность uint32 только для чтения)
+    def assigned_codes(self):
+        return self._codes
+
+    def is_assigned(self, code):
+        return self._position(code) != -1
+
+    # название символа или "no info"
+    def get_name(self, code):
+        i = self._position(code)
+        if i == -1:
+            return self._no_info_str
+        return self._name_at(i)
 
     def get_info_for(self, code):
-        name = self._symbol_list[code]
-        if name != self._no_info_str:
-            return format(code, '04X') + " | " + name
+        i = self._position(code)
+        if i != -1:
+            return format(code, '04X') + " | " + self._name_at(i)
+
+    # название раздела, в диапазон которого попадает code, или None
+    def block_for(self, code):
+        i = bisect_right(self._block_starts, code) - 1
+        if i >= 0 and code <= self._block_ranges[i][1]:
+            return self._block_ranges[i][2]
+
+    # (first-code, last-code) раздела
+    def block_range(self, name):
+        return self._block_info[name][:2]
+
+    # первый назначенный код раздела и количество символов в нем
+    def block_first(self, name):
+        return self._codes[self._block_info[name][2]]
+
+    def block_count(self, name):
+        info = self._block_info[name]
+        return info[3] - info[2]
 
     def find_block_name(self, sub_str):
-        found = []
-        for block_name, symbols in self._table.items():
-            if sub_str.lower() in block_name.lower():
-                first = 0xfffff
-                for code, symbol_name in symbols.items():
-                    first = min(first, code)
-                found.append((block_name, first, ' {0} символов'.format(len(symbols))))
-        return found
+        return list(self.iter_block_name(sub_str))
+
+    # то же, что find_block_name, но найденные разделы выдаются по одному
+    def iter_block_name(self, sub_str):
+        sub_str = sub_str.lower()
+        for block_name, info in self._block_info.items():
+            if sub_str in block_name.lower():
+                yield (block_name, self._codes[info[2]],
+                       ' {0} символов'.format(info[3] - info[2]))
+
+    # возрастающие коды символов с триграммой gram в названии или None
+    def _posting(self, gram):
+        key = trigram_key(gram)
+        k = bisect_left(self._gram_keys, key)
+        if k == len(self._gram_keys) or self._gram_keys[k] != key:
+            return None
+        return self._postings[self._gram_offsets[k]:self._gram_offsets[k + 1]]
 
     def find_symbol_name(self, sub_str):
-        found = []
-        for block_name, symbols in self._table.items():
-            for code, symbol_name in symbols.items():
-                if sub_str.lower() in symbol_name.lower():
-                    found.append((block_name, code, symbol_name))
-        return found
+        return list(self.iter_symbol_name(sub_str))
+
+    # коды символов, в названии которых есть все триграммы sub_str (в нижнем регистре,
+    # не короче 3 букв); могут попасться лишние, совпадение проверяется отдельно.
+    # None, если кандидатов заведомо больше limit
+    def _name_candidates(self, sub_str, limit=None):
+        postings = []
+        for gram in {sub_str[j:j + 3] for j in range(len(sub_str) - 2)}:
+            posting = self._posting(gram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        if limit is not None and len(postings[0]) > limit:
+            return None
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            # оставшихся кандидатов дешевле проверить напрямую
+            if len(candidates) * 8 < len(posting):
+                break
+            candidates.intersection_update(posting)
+        return candidates
+
+    # позиции в _codes возрастающих назначенных кодов sorted_codes; назначенные коды
+    # в основном идут подряд, поэтому позиция сначала угадывается по предыдущей
+    def _positions(self, sorted_codes):
+        codes = self._codes
+        i = 0
+        for code in sorted_codes:
+            guess = i + code - codes[i]
+            if guess >= len(codes) or codes[guess] != code:
+                guess = bisect_left(codes, code, i, min(guess, len(codes)))
+            i = guess
+            yield i
+
+    # то же, что find_symbol_name, но найденные символы выдаются по одному
+    def iter_symbol_name(self, sub_str):
+        sub_str = sub_str.lower()
+        codes = self._codes
+        found = None
+        if len(sub_str) >= 3:
+            found = self._name_candidates(sub_str, len(codes) // 4)
+        # кандидатов немного - проверяются только они, по возрастанию
+        if found is not None:
+            for block_name, i in self._with_blocks(self._positions(sorted(found))):
+                name = self._name_at(i)
+                if sub_str in name.lower():
+                    yield (block_name, codes[i], name)
+            return
+        # иначе вся таблица по разделам, раздел декодируется одним куском,
+        # разделы без совпадений пропускаются целиком
+        for block_name, info in self._block_info.items():
+            begin, end = info[2], info[3]
+            text = self._names_text(begin, end)
+            lower = text.lower()
+            if sub_str not in lower:
+                continue
+            for code, name, lower_name in zip(codes[begin:end], text.split('\n'),
+                                              lower.split('\n')):
+                if sub_str in lower_name:
+                    yield (block_name, code, name)
+
+    # поиск по нескольким словам запроса в любом порядке, все должны быть в названии;
+    # лучшие совпадения первыми: слово целиком, затем начало слова, затем часть слова,
+    # при равенстве - более короткое название и меньший код.
+    # Выдается не больше limit символов, начиная с offset-го лучшего.
+    # Перебор прекращается, как только cancelled() вернет True, результат тогда неполный
+    def rank_symbol_name(self, query, limit=50, offset=0, cancelled=None):
+        tokens = query.lower().split()
+        if not tokens or limit <= 0:
+            return []
+        candidates = None
+        for token in sorted(tokens, key=len, reverse=True):
+            if len(token) < 3:
+                break
+            found = self._name_candidates(token)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return []
+        if candidates is None:
+            candidates = self._table_positions()
+        else:
+            candidates = self._positions(sorted(candidates))
+
+        def scored():
+            for i in candidates:
+                if cancelled is not None and cancelled():
+                    return
+                lower = self._name_at(i).lower()
+                words = self.WORD_SEPARATORS.split(lower)
+                rank = 0
+                for token in tokens:
+                    if token in words:
+                        continue
+                    if any(word.startswith(token) for word in words):
+                        rank += 1
+                    elif token in lower:
+                        rank += 2
+                    else:
+                        break
+                else:
+                    yield (rank, len(lower), i)
+
+        # куча из offset + limit лучших, без сортировки всех найденных
+        best = heapq.nsmallest(offset + limit, scored())
+        return [self._entry_at(i) for rank, length, i in best[offset:]]
+
+    # найденные коды без повторов, в порядке возрастания, по одному
+    def _iter_codes(self, codes):
+        for code in sorted(codes):
+            i = self._position(code)
+            if i != -1 and self.block_for(code) is not None:
+                yield self._entry_at(i)
 
     def find_symbols(self, sub_str):
-        found = []
-        for block_name, symbols in self._table.items():
-            for code, symbol_name in symbols.items():
-                if chr(code) in sub_str:
-                    found.append((block_name, code, symbol_name))
-        return found
+        return list(self.iter_symbols(sub_str))
+
+    def iter_symbols(self, sub_str):
+        return self._iter_codes({ord(ch) for ch in sub_str})
 
     def find_codes(self, sub_str, base):
-        found = []
-        codes = []
+        return list(self.iter_codes(sub_str, base))
+
+    def iter_codes(self, sub_str, base):
         if base == 16:
-            matches = re.findall(r'[0-9A-Fa-f]{1,5}', sub_str)
+            matches = re.findall(r'[0-9A-Fa-f]{1,6}', sub_str)
         if base == 10:
-            matches = re.findall(r'[0-9]{1,6}', sub_str)
-        for code in matches:
-            codes.append(int(code, base))
-        for block_name, symbols in self._table.items():
-            for code, symbol_name in symbols.items():
-                if code in codes:
-                    found.append((block_name, code, symbol_name))
-        return found
+            matches = re.findall(r'[0-9]{1,7}', sub_str)
+        return self._iter_codes({int(code, base) for code in matches})
+
+    # разбор текста chunks (строка или итератор строк, например файл по частям):
+    # для каждого символа в порядке первого появления (код, раздел, название, количество),
+    # для кода вне разделов раздел None, для неназначенного название None.
+    # Время линейно от длины текста, память зависит только от числа разных символов
+    def analyze_text(self, chunks):
+        if isinstance(chunks, str):
+            chunks = (chunks,)
+        counts = Counter()
+        for chunk in chunks:
+            counts.update(chunk)
+        for char, count in counts.items():
+            code = ord(char)
+            i = self._position(code)
+            yield (code, self.block_for(code), None if i == -1 else self._name_at(i), count)
 
     def get_block(self, name):
-        return(self._table[name])
+        info = self._block_info[name]
+        return {self._codes[i]: self._name_at(i) for i in range(info[2], info[3])}
+
+
+'''
+Хранит последние использованные таблицы UnicodeTable (не больше capacity),
+чтобы переключение языка не перечитывало данные заново.
+Можно вызывать из нескольких потоков, загрузки выполняются по очереди.
+Не зависящие от языка данные (диапазоны разделов, назначенные коды)
+у таблиц разных языков общие. Методы *_all ищут сразу на нескольких языках.
+'''
+
+
+class TableManager:
+
+    SHARED_ATTRS = ('_blocks', '_codes', '_block_starts')
+
+    def __init__(self, file_name, capacity=2, executor=None):
+        self.file_name = file_name
+        self.capacity = capacity
+        self.executor = executor
+        self._tables = OrderedDict()
+        self._shared = {}
+        self._lock = threading.Lock()
+
+    def get(self, lang_str):
+        with self._lock:
+            table = self._tables.get(lang_str)
+            if table is not None:
+                self._tables.move_to_end(lang_str)
+                return table
+            table = UnicodeTable(self.file_name, lang_str, self.executor)
+            self._share(table)
+            self._tables[lang_str] = table
+            while len(self._tables) > self.capacity:
+                self._tables.popitem(last=False)
+            return table
+
+    # поиск по названиям символов сразу на всех языках langs (capacity должно быть
+    # не меньше len(langs), иначе таблицы будут вытеснять друг друга): каждый код
+    # выдается один раз, с названием на языке lang_str, сначала найденные на нем
+    def iter_symbol_name_all(self, sub_str, lang_str, langs):
+        table = self.get(lang_str)
+        seen = set()
+        for entry in table.iter_symbol_name(sub_str):
+            seen.add(entry[1])
+            yield entry
+        for lang in langs:
+            if lang == lang_str:
+                continue
+            for entry in self.get(lang).iter_symbol_name(sub_str):
+                code = entry[1]
+                if code in seen:
+                    continue
+                seen.add(code)
+                if table.is_assigned(code):
+                    entry = (table.block_for(code), code, table.get_name(code))
+                yield entry
+
+    def find_symbol_name_all(self, sub_str, lang_str, langs):
+        return sorted(self.iter_symbol_name_all(sub_str, lang_str, langs),
+                      key=lambda entry: entry[1])
+
+    # поиск по названиям разделов на всех языках langs, разделы с названиями
+    # на языке lang_str, в том же порядке, что и у find_block_name;
+    # если cancelled() вернет True, следующие языки не загружаются и результат пустой
+    def find_block_name_all(self, sub_str, lang_str, langs, cancelled=None):
+        table = self.get(lang_str)
+        found = set()
+        for lang in [lang_str] + [lang for lang in langs if lang != lang_str]:
+            if cancelled is not None and cancelled():
+                return []
+            for block_name, code, count_str in self.get(lang).iter_block_name(sub_str):
+                found.add(table.block_for(code))
+        return [entry for entry in table.find_block_name('') if entry[0] in found]
+
+    # совпадающие с уже загруженными данные заменяются общим экземпляром
+    def _share(self, table):
+        for attr in self.SHARED_ATTRS:
+            value = getattr(table, attr)
+            shared = self._shared.get(attr)
+            if shared is not None and shared == value:
+                setattr(table, attr, shared)
+            else:
+                self._shared[attr] = value
+
+
+# разбор архива и запись кэша одного языка в процессе пула build_caches
+def _build_cache(file_name, lang):
+    return UnicodeTable(file_name, lang).ok
+
+
+# подготовка кэша сразу для нескольких языков: каждый язык собирается целиком
+# (разбор, таблица, индекс названий) в отдельном процессе пула из workers
+# процессов; результат - таблицы, открытые из готового кэша
+def build_caches(file_name, langs, workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as executor:
+        list(executor.map(_build_cache, [file_name] * len(langs), langs))
+    return [UnicodeTable(file_name, lang) for lang in langs]
+
+
+# python data_loader.py [lang ...] - подготовить кэш для указанных языков
+if __name__ == '__main__':
+    build_caches('unicode-table-data-master.zip', sys.argv[1:] or ['ru', 'en'])
@@ -1,40 +1,112 @@
-from PyQt5.QtWidgets import (QDialog, QLineEdit, QVBoxLayout, QPushButton, QLabel)
-import requests
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import (QDialog, QLineEdit, QVBoxLayout, QPushButton, QLabel,
+                             QProgressBar)
+from archive_fetch import fetch_archive
 
 URL = "https://github.com/unicode-table/unicode-table-data/archive/master.zip"
 
 
+'''
+Загружает архив через fetch_archive в отдельном потоке,
+сообщает о ходе загрузки сигналом progress(done, total), total = 0 - неизвестно.
+'''
+
+
+class DownloadWorker(QThread):
+
+    progress = pyqtSignal(int, int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, source, file_name, sha256, parent):
+        super(DownloadWorker, self).__init__(parent)
+        self.source = source
+        self.file_name = file_name
+        self.sha256 = sha256
+        self.ok = False
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            fetch_archive(self.source, self.file_name,
+                          progress=lambda done, total: self.progress.emit(done, total or 0),
+                          sha256=self.sha256,
+                          cancelled=lambda: self._cancelled)
+            self.ok = True
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
 class Downloader(QDialog):
     def __init__(self, file_name, parent):
         super(Downloader, self).__init__(parent)
 
         self.file_name = file_name
+        self.worker = None
 
-        self.label = QLabel('"{0}" не найден.\nМожно взять здесь:'.format(file_name))
+        self.label = QLabel('"{0}" не найден.\nМожно взять здесь (URL или путь к файлу):'.format(
+            file_name))
         self.edit = QLineEdit(URL)
+        self.checksum = QLineEdit()
+        self.checksum.setPlaceholderText('SHA-256 (необязательно)')
+        self.progress = QProgressBar()
+        self.progress.hide()
         self.button = QPushButton('Скачать')
         self.button.clicked.connect(self.downloadUTData)
 
         main_box = QVBoxLayout()
         main_box.addWidget(self.label)
         main_box.addWidget(self.edit)
+        main_box.addWidget(self.checksum)
+        main_box.addWidget(self.progress)
         main_box.addWidget(self.button)
         self.setLayout(main_box)
         self.setFixedWidth(500)
         self.setWindowTitle(parent.APP_NAME)
 
-    # загрузка архива с данными с github через requests
+    # загрузка архива в фоновом потоке, повторное нажатие прерывает ее;
+    # прерванная загрузка продолжается с того же места
     def downloadUTData(self):
-        self.button.setDisabled(True)
-        self.button.setText('Загрузка...')
+        if self.worker is not None:
+            self.worker.cancel()
+            return
+        self.button.setText('Прервать')
         self.edit.setDisabled(True)
-        self.repaint()
-        try:
-            r = requests.get(URL, allow_redirects=True)
-            if r.status_code > 200:
-                raise Exception('Невозможно скачать архив.')
-            open(self.file_name, 'wb').write(r.content)
+        self.checksum.setDisabled(True)
+        self.progress.setRange(0, 0)
+        self.progress.show()
+        self.worker = DownloadWorker(self.edit.text().strip(), self.file_name,
+                                     self.checksum.text().strip(), self)
+        self.worker.progress.connect(self.showProgress)
+        self.worker.failed.connect(self.downloadFailed)
+        self.worker.finished.connect(self.downloadFinished)
+        self.worker.start()
+
+    def showProgress(self, done, total):
+        if total > 0:
+            # QProgressBar работает с int, считаем в килобайтах
+            self.progress.setRange(0, total >> 10)
+            self.progress.setValue(done >> 10)
+        self.progress.setFormat('{0:.1f} МБ'.format(done / (1 << 20)))
+
+    def downloadFailed(self, message):
+        self.label.setText('Ошибка: ' + message)
+
+    def downloadFinished(self):
+        ok = self.worker.ok
+        self.worker.deleteLater()
+        self.worker = None
+        if ok:
             self.accept()
-        except Exception as e:
-            self.label.setText('Ошибка: ' + str(e))
-            self.button.setText('Загрузка не удалась...')
+            return
+        self.button.setText('Продолжить загрузку')
+        self.edit.setDisabled(False)
+        self.checksum.setDisabled(False)
+
+    def reject(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        super(Downloader, self).reject()
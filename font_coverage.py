@@ -0,0 +1,95 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QFont, QFontDatabase, QFontMetrics, QRawFont
+from instrument import log, profile_thread, span
+
+
+'''
+Какие из назначенных символов шрифт может нарисовать, с учетом
+подстановки недостающих глифов из других шрифтов: битовая карта по кодам.
+'''
+
+
+class GlyphCoverage:
+    def __init__(self, bitmap):
+        self.bitmap = bitmap
+
+    def supports(self, code):
+        i = code >> 3
+        return i < len(self.bitmap) and bool(self.bitmap[i] >> (code & 7) & 1)
+
+
+'''
+Вычисляет GlyphCoverage шрифта для назначенных кодов таблицы в отдельном потоке.
+Результат сохраняется в file_name с ключом (семейство, начертание, хэш таблицы
+head шрифта, хэш списка установленных семейств, от которых зависит подстановка,
+хэш списка кодов), так что при повторных запусках с теми же шрифтами и теми же
+данными вычислять заново не нужно.
+'''
+
+
+class CoverageLoader(QThread):
+
+    ready = pyqtSignal(object)
+
+    def __init__(self, font, codes, file_name, parent):
+        super(CoverageLoader, self).__init__(parent)
+        self.font = QFont(font)
+        self.codes = codes
+        self.file_name = file_name
+
+    def run(self):
+        with profile_thread():
+            raw = QRawFont.fromFont(self.font)
+            families = '\n'.join(QFontDatabase().families()).encode('utf-8')
+            key = (raw.familyName(), raw.styleName(),
+                   hashlib.sha1(raw.fontTable(b'head')).hexdigest(),
+                   hashlib.sha1(families).hexdigest(),
+                   hashlib.sha1(self.codes.tobytes()).hexdigest())
+
+            cache = {}
+            if os.path.exists(self.file_name):
+                try:
+                    with open(self.file_name, 'rb') as f:
+                        cache = pickle.load(f)
+                except Exception as e:
+                    log.warning('Broken coverage cache "%s": %s', self.file_name, e)
+
+            bitmap = cache.get(key)
+            if bitmap is None:
+                with span('coverage.compute', family=key[0], codes=len(self.codes)):
+                    # QRawFont видит только основной шрифт, QFontMetrics - и подстановку
+                    metrics = QFontMetrics(self.font)
+                    bitmap = bytearray((self.codes[-1] >> 3) + 1 if self.codes else 0)
+                    for code in self.codes:
+                        if metrics.inFontUcs4(code):
+                            bitmap[code >> 3] |= 1 << (code & 7)
+                    bitmap = bytes(bitmap)
+                cache[key] = bitmap
+                self.save(cache)
+                log.info('Glyph coverage for "%s" computed: %d symbols',
+                         key[0], sum(bin(b).count('1') for b in bitmap))
+        self.ready.emit(GlyphCoverage(bitmap))
+
+    # запись через временный файл, чтобы не оставить обрезанный кэш
+    def save(self, cache):
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(
+                prefix=os.path.basename(self.file_name) + '.', suffix='.tmp',
+                dir=os.path.dirname(self.file_name) or '.')
+            # mkstemp создает файл с правами 0600
+            os.chmod(tmp_name, 0o644)
+            with open(fd, 'wb') as f:
+                pickle.dump(cache, f)
+            os.replace(tmp_name, self.file_name)
+        except OSError as e:
+            log.warning('Unable to write coverage cache "%s": %s', self.file_name, e)
+            if tmp_name is not None:
+                try:
+                    os.remove(tmp_name)
+                except OSError:
+                    pass
@@ -0,0 +1,110 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+'''
+Замеры времени по именованным участкам (span) и журнал приложения.
+Все выключено, пока не задано одно из переменных окружения:
+    QUNICODER_LOG=<файл или ->      журнал уровня DEBUG с длительностью участков
+    QUNICODER_TRACE=<файл>          участки в формате JSON lines:
+                                    {"name", "ts", "dur", "thread", ...}
+    QUNICODER_PROFILE=<файл>        cProfile запуска main.py (до загрузки таблицы
+                                    и покрытия шрифта, вместе с фоновыми потоками)
+'''
+
+log = logging.getLogger('qunicoder')
+
+_trace_file = None
+_trace_lock = threading.Lock()
+_profiler = None
+_profile_name = None
+# профили фоновых потоков (profile_thread), завершившихся до stop_profile
+_thread_profiles = []
+
+
+def configure():
+    global _trace_file
+    log_name = os.environ.get('QUNICODER_LOG')
+    if log_name and not log.handlers:
+        if log_name == '-':
+            handler = logging.StreamHandler()
+        else:
+            handler = logging.FileHandler(log_name, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(threadName)s %(levelname)s %(message)s'))
+        log.addHandler(handler)
+        log.setLevel(logging.DEBUG)
+    trace_name = os.environ.get('QUNICODER_TRACE')
+    if trace_name and _trace_file is None:
+        _trace_file = open(trace_name, 'a', encoding='utf-8')
+
+
+# fields передаются как есть и переводятся в строки, только если журнал
+# или трассировка включены
+@contextmanager
+def span(name, **fields):
+    if _trace_file is None and not log.isEnabledFor(logging.DEBUG):
+        yield
+        return
+    ts = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        dur = time.perf_counter() - start
+        log.debug('%s: %.2f ms %s', name, dur * 1000, fields or '')
+        if _trace_file is not None:
+            event = dict(fields, name=name, ts=ts, dur=dur,
+                         thread=threading.current_thread().name)
+            with _trace_lock:
+                _trace_file.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+                _trace_file.flush()
+
+
+# профилирование текущего потока от start_profile до stop_profile,
+# фоновые потоки профилируются отдельно, см. profile_thread
+def start_profile():
+    global _profiler, _profile_name
+    _profile_name = os.environ.get('QUNICODER_PROFILE')
+    if _profile_name:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+# профилирование блока with в фоновом потоке, пока идет start_profile;
+# результат нужно отдавать после блока, чтобы профиль успел попасть в общий
+@contextmanager
+def profile_thread():
+    if _profiler is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _trace_lock:
+            _thread_profiles.append(profiler)
+
+
+def stop_profile():
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        stats = pstats.Stats(_profiler)
+        with _trace_lock:
+            for profiler in _thread_profiles:
+                stats.add(profiler)
+            del _thread_profiles[:]
+        stats.dump_stats(_profile_name)
+        log.info('startup profile saved to "%s"', _profile_name)
+        _profiler = None
+
+
+configure()
@@ -2,18 +2,25 @@
 
 import sys
 import os
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont
 from PyQt5.QtWidgets import (QDialog, QInputDialog, QWidget, QPushButton, QLineEdit,
                              QHBoxLayout, QVBoxLayout, QSizePolicy, QMessageBox,
                              QApplication, QScrollArea, QComboBox)
 from charwidget import CharacterWidget
-from data_loader import UnicodeTable, Settings
-from search_dialog import UnicodeSearch
-from download_dialog import Downloader
+from data_loader import TableManager, Settings
+from table_loader import TableLoader
+from font_coverage import CoverageLoader
+import instrument
 
 
 class Main(QWidget):
+
+    # таблица на запрошенном языке загружена и стала текущей
+    tableReady = pyqtSignal(object)
+    # язык, сообщение об ошибке; текущей остается прежняя таблица
+    tableLoadFailed = pyqtSignal(str, str)
+
     def __init__(self, parent=None):
         super(Main, self).__init__(parent)
 
@@ -28,11 +35,22 @@ class Main(QWidget):
         self.settings = Settings(self.APP_NAME)
 
         if not os.path.exists(self.UT_FILENAME):
+            # редко нужен, импортируется только при отсутствии архива
+            from download_dialog import Downloader
             dl_dialog = Downloader(self.UT_FILENAME, self)
             if dl_dialog.exec_() != QDialog.Accepted:
                 sys.exit()
 
-        self.table = UnicodeTable(self.UT_FILENAME, self.settings.lang)
+        self.tables = TableManager(self.UT_FILENAME, capacity=len(self.LANG_STRINGS))
+        # таблица загружается в фоне, до готовности None
+        self.table = None
+        self.pending_lang = None
+        # GlyphCoverage для big_font, вычисляется в фоне после загрузки таблицы;
+        # coverage_codes - назначенные коды, для которых она запущена (общие у языков)
+        self.coverage = None
+        self.coverage_codes = None
+        # окно поиска создается при первом открытии и затем переиспользуется
+        self.search_dialog = None
 
         self.edit = QLineEdit()
         self.edit.setClearButtonEnabled(True)
@@ -49,6 +67,7 @@ class Main(QWidget):
         edit_bar.addWidget(copy_button)
 
         self.chars = CharacterWidget(self)
+        self.chars.compact = self.settings.compact
         self.chars.characterSelected.connect(self.edit.insert)
 
         self.scroll_area = QScrollArea()
@@ -65,25 +84,33 @@ class Main(QWidget):
         self.bookmarks.addItems(self.settings.bookmarks)
 
         # сохранить текущую позицию CharacterWidget в закладки
-        bookmark_button = QPushButton(QIcon('icons/bookmark24.png'), '')
-        bookmark_button.setToolTip('добавить закладку')
-        bookmark_button.clicked.connect(self.setBookmark)
+        self.bookmark_button = QPushButton(QIcon('icons/bookmark24.png'), '')
+        self.bookmark_button.setToolTip('добавить закладку')
+        self.bookmark_button.clicked.connect(self.setBookmark)
 
         # открыть окно поиска разделов/символов в юникоде
-        find_button = QPushButton()
-        find_button.setIcon(self.search_icon)
-        find_button.setToolTip('поиск в юникоде')
-        find_button.clicked.connect(self.unicodeSearch)
+        self.find_button = QPushButton()
+        self.find_button.setIcon(self.search_icon)
+        self.find_button.setToolTip('поиск в юникоде')
+        self.find_button.clicked.connect(self.unicodeSearch)
 
         del_button = QPushButton(QIcon('icons/backspace24.png'), '')
         del_button.setToolTip('удалить закладку')
         del_button.clicked.connect(self.delBookmark)
 
+        # компактный вид: скрыть строки без назначенных символов
+        compact_button = QPushButton('⇕')
+        compact_button.setCheckable(True)
+        compact_button.setChecked(self.chars.compact)
+        compact_button.setToolTip('скрыть пустые строки')
+        compact_button.toggled.connect(self.setCompact)
+
         bookmark_bar = QHBoxLayout()
         bookmark_bar.addWidget(self.bookmarks, 1)
-        bookmark_bar.addWidget(bookmark_button)
+        bookmark_bar.addWidget(self.bookmark_button)
         bookmark_bar.addWidget(del_button)
-        bookmark_bar.addWidget(find_button)
+        bookmark_bar.addWidget(compact_button)
+        bookmark_bar.addWidget(self.find_button)
 
         self.main_box = QVBoxLayout()
         self.main_box.addLayout(bookmark_bar)
@@ -94,21 +121,100 @@ class Main(QWidget):
         self.setMinimumHeight(716)
         self.setWindowTitle(self.APP_NAME)
 
+        self.loadTable(self.settings.lang)
+
+    # загрузка таблицы на указанном языке в фоновом потоке,
+    # пока она идет, таблица символов и поиск недоступны;
+    # результат - сигналы tableReady или tableLoadFailed
+    def loadTable(self, lang_str):
+        self.pending_lang = lang_str
+        self.setTableReady(False)
+        loader = TableLoader(self.tables, lang_str, self)
+        loader.loaded.connect(self.tableLoaded)
+        loader.failed.connect(self.tableFailed)
+        loader.finished.connect(loader.deleteLater)
+        loader.start()
+
+    def tableLoaded(self, table):
+        # результат устаревшего запроса, язык уже сменили
+        if table.lang != self.pending_lang:
+            return
+        self.table = table
+        self.setTableReady(True)
+        self.tableReady.emit(table)
+        if table.assigned_codes() is self.coverage_codes:
+            return
+        self.coverage_codes = table.assigned_codes()
+        coverage_loader = CoverageLoader(
+            self.big_font, table.assigned_codes(), self.APP_NAME + '.coverage', self)
+        coverage_loader.ready.connect(self.coverageReady)
+        coverage_loader.finished.connect(coverage_loader.deleteLater)
+        coverage_loader.start()
+
+    def coverageReady(self, coverage):
+        self.coverage = coverage
+        self.chars.setCoverage(coverage)
+        instrument.stop_profile()
+
+    # если уже была загружена таблица на другом языке, работа продолжается с ней
+    def tableFailed(self, lang_str, message):
+        # ошибка устаревшего запроса, язык уже сменили
+        if lang_str != self.pending_lang:
+            return
+        if self.table is not None:
+            self.pending_lang = self.table.lang
+            self.setTableReady(True)
+        else:
+            self.setWindowTitle('{0} — ошибка загрузки'.format(self.APP_NAME))
+            instrument.stop_profile()
+        self.tableLoadFailed.emit(lang_str, message)
+        QMessageBox.critical(self, self.APP_NAME, 'Ошибка загрузки данных: ' + message)
+
+    def setTableReady(self, ready):
+        self.chars.setEnabled(ready)
+        self.bookmark_button.setEnabled(ready)
+        self.find_button.setEnabled(ready)
+        if ready:
+            code = self.topCode()
+            self.chars.updateLayout()
+            self.scrollToCode(code)
+            self.showCurrentBlock(self.topCode())
+        else:
+            self.chars.update()
+            self.setWindowTitle('{0} — загрузка...'.format(self.APP_NAME))
+
+    def setCompact(self, compact):
+        code = self.topCode()
+        self.chars.compact = compact
+        self.chars.updateLayout()
+        self.scrollToCode(code)
+
+    # первый код в верхней видимой строке CharacterWidget
+    def topCode(self):
+        return self.chars.rowStart(
+            self.scroll_area.verticalScrollBar().value() // self.chars.cell_size)
+
+    def scrollToCode(self, code):
+        self.scroll_area.verticalScrollBar().setValue(
+            self.chars.cell_size * self.chars.rowForCode(code))
+
     # сохранить текущую позицию в CharacterWidget в закладки
     def setBookmark(self):
-        code = self.scroll_area.verticalScrollBar().value() // \
-            self.chars.cell_size * self.chars.columns
+        code = self.topCode()
         text, ok = QInputDialog.getText(
             self, self.APP_NAME,
             'Добавить закладку для позиции 0x{:04X}:\t\t'.format(code),
-            QLineEdit.Normal, self.table._symbol_list[code])
+            QLineEdit.Normal, self.table.get_name(code))
         if ok:
             self.bookmarks.insertItem(0, '{0:04X} - {1}'.format(code, text))
             self.bookmarks.setCurrentIndex(0)
 
     # открыть окно поиска разделов/символов в юникоде
     def unicodeSearch(self):
-        bs = UnicodeSearch(self)
+        if self.search_dialog is None:
+            from search_dialog import UnicodeSearch
+            self.search_dialog = UnicodeSearch(self)
+        bs = self.search_dialog
         if bs.exec_() == QDialog.Accepted:
             text = '{0:04X} - {1}'.format(bs.selected_code, bs.selected_item)
             i = self.bookmarks.findText(text)
@@ -116,8 +222,7 @@ class Main(QWidget):
                 self.bookmarks.removeItem(i)
             self.bookmarks.insertItem(0, text)
             self.bookmarks.setCurrentIndex(0)
-            self.scroll_area.verticalScrollBar().setValue(
-                self.chars.cell_size * (bs.selected_code // self.chars.columns))
+            self.scrollToCode(bs.selected_code)
 
     def delBookmark(self):
         self.bookmarks.removeItem(self.bookmarks.currentIndex())
@@ -126,9 +231,8 @@ class Main(QWidget):
     def jumpToBookmark(self, index):
         code = 32
         if self.bookmarks.count() > 0:
-            code = int(self.bookmarks.itemText(index)[:5], 16)
-        self.scroll_area.verticalScrollBar().setValue(
-            self.chars.cell_size * (code // self.chars.columns))
+            code = int(self.bookmarks.itemText(index).split(' ', 1)[0], 16)
+        self.scrollToCode(code)
         self.edit.setFocus()
 
     def copyClicked(self):
@@ -140,6 +244,16 @@ class Main(QWidget):
         row = pos // self.chars.cell_size
         self.scroll_area.verticalScrollBar().setValue(
             row * self.chars.cell_size)
+        if self.table is not None:
+            self.showCurrentBlock(self.chars.rowStart(row))
+
+    # название раздела, видимого в верхней строке CharacterWidget, в заголовке окна
+    def showCurrentBlock(self, code):
+        block_name = self.table.block_for(code)
+        if block_name is None:
+            self.setWindowTitle(self.APP_NAME)
+        else:
+            self.setWindowTitle('{0} — {1}'.format(self.APP_NAME, block_name))
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_F1:
@@ -148,15 +262,20 @@ class Main(QWidget):
             self.close()
 
     def closeEvent(self, event):
-        self.settings.lang = self.table.lang
+        for thread in self.findChildren(QThread):
+            thread.wait()
+        if self.table is not None:
+            self.settings.lang = self.table.lang
         self.settings.bookmarks = [
             self.bookmarks.itemText(i) for i in range(self.bookmarks.count())]
         self.settings.editstring = self.edit.text()
+        self.settings.compact = self.chars.compact
         self.settings.save()
 
 
 if __name__ == '__main__':
 
+    instrument.start_profile()
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon('icons/favicon.ico'))
     mainWidget = Main()
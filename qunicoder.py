@@ -0,0 +1,156 @@
+#! /usr/bin/python3
+
+import argparse
+import json
+import sys
+from zipfile import BadZipFile
+from data_loader import UnicodeTable, TableManager, block_histogram
+
+'''
+Поиск по таблице юникода из командной строки, без Qt.
+Режимы совпадают с режимами окна поиска:
+    block - по названию раздела, name - по названию символа,
+    char - по символам, hex/dec - по кодам,
+    rank - по словам названия в любом порядке, лучшие первыми (--limit, --offset).
+analyze - разбор текста (из аргументов или из stdin по частям): символы в порядке
+    появления с количеством, или число символов по разделам (--blocks).
+С --langs названия в режимах block и name ищутся сразу на нескольких языках,
+результаты выводятся на языке --lang.
+Запросы берутся из аргументов или построчно из stdin (--batch).
+
+    python qunicoder.py name arrow
+    python qunicoder.py --limit 10 rank arrow double left
+    python qunicoder.py --lang ru --langs ru,en name arrow
+    python qunicoder.py --json analyze < text.txt
+    python qunicoder.py --json --lang en hex 1F600 41
+    cat codes.txt | python qunicoder.py --batch --json hex
+'''
+
+MODES = ['block', 'name', 'char', 'hex', 'dec', 'rank', 'analyze']
+
+# размер части текста, читаемой из stdin в режиме analyze
+READ_SIZE = 1 << 16
+
+
+def load_table(file_name, lang_str):
+    return UnicodeTable(file_name, lang_str)
+
+
+# результаты запроса query в режиме mode: словари с полями для вывода,
+# limit и offset используются только в режиме rank; если заданы tables (TableManager)
+# и langs, в режимах block и name названия ищутся на всех языках langs
+def lookup(table, mode, query, limit=50, offset=0, tables=None, langs=()):
+    if mode == 'block':
+        if tables is not None:
+            found = tables.find_block_name_all(query, table.lang, langs)
+        else:
+            found = table.find_block_name(query)
+        return [{'block': block_name, 'code': '{:04X}'.format(code),
+                 'count': table.block_count(block_name)}
+                for block_name, code, count_str in found]
+    if mode == 'name' and tables is not None:
+        found = tables.find_symbol_name_all(query, table.lang, langs)
+    elif mode == 'name':
+        found = table.find_symbol_name(query)
+    elif mode == 'char':
+        found = table.find_symbols(query)
+    elif mode == 'hex':
+        found = table.find_codes(query, 16)
+    elif mode == 'dec':
+        found = table.find_codes(query, 10)
+    elif mode == 'rank':
+        found = table.rank_symbol_name(query, limit, offset)
+    else:
+        raise ValueError('unknown mode: ' + mode)
+    return [{'code': '{:04X}'.format(code), 'char': chr(code),
+             'name': name, 'block': block_name}
+            for block_name, code, name in found]
+
+
+# разбор текста chunks (строка или итератор строк) в режиме analyze:
+# по символам или, если blocks, по разделам
+def analyze(table, chunks, blocks=False):
+    rows = table.analyze_text(chunks)
+    if blocks:
+        return [{'block': block_name, 'count': count}
+                for block_name, count in block_histogram(rows)]
+    return ({'code': '{:04X}'.format(code), 'char': chr(code), 'count': count,
+             'name': name, 'block': block_name}
+            for code, block_name, name, count in rows)
+
+
+def format_row(row):
+    row = {key: '-' if value is None else value for key, value in row.items()}
+    if 'char' in row and 'count' in row:
+        return '{code}\t{count}\t{char}\t{name}\t{block}'.format(**row)
+    if 'char' in row:
+        return '{code}\t{char}\t{name}\t{block}'.format(**row)
+    if 'code' not in row:
+        return '{count}\t{block}'.format(**row)
+    return '{code}\t{count}\t{block}'.format(**row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='qunicoder', description='Поиск символов и разделов юникода.')
+    parser.add_argument('mode', choices=MODES)
+    parser.add_argument('query', nargs='*')
+    parser.add_argument('--data', default='unicode-table-data-master.zip',
+                        help='архив unicode-table-data')
+    parser.add_argument('--lang', default='en')
+    parser.add_argument('--blocks', action='store_true',
+                        help='в режиме analyze - число символов по разделам')
+    parser.add_argument('--langs', type=lambda value: value.split(','), default=None,
+                        help='искать названия на этих языках, через запятую')
+    parser.add_argument('--json', action='store_true', help='вывод в формате JSON lines')
+    parser.add_argument('--batch', action='store_true',
+                        help='читать запросы построчно из stdin')
+    parser.add_argument('--limit', type=int, default=50,
+                        help='число результатов в режиме rank')
+    parser.add_argument('--offset', type=int, default=0,
+                        help='пропустить столько лучших результатов в режиме rank')
+    args = parser.parse_args(argv)
+
+    tables = None
+    try:
+        if args.langs:
+            tables = TableManager(args.data, capacity=len(args.langs) + 1)
+            table = tables.get(args.lang)
+        else:
+            table = load_table(args.data, args.lang)
+    except (OSError, BadZipFile) as e:
+        parser.error('не удалось прочитать архив "{0}": {1}'.format(args.data, e))
+    except KeyError:
+        parser.error('в архиве "{0}" нет языка "{1}"'.format(args.data, args.lang))
+    out = sys.stdout
+    if args.mode == 'analyze':
+        if args.query:
+            chunks = ' '.join(args.query)
+        else:
+            chunks = iter(lambda: sys.stdin.read(READ_SIZE), '')
+        for row in analyze(table, chunks, args.blocks):
+            if args.json:
+                out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            else:
+                out.write(format_row(row) + '\n')
+        return 0
+
+    if args.batch:
+        queries = (line.rstrip('\n') for line in sys.stdin)
+    else:
+        queries = [' '.join(args.query)]
+
+    for query in queries:
+        for row in lookup(table, args.mode, query, args.limit, args.offset,
+                          tables, args.langs):
+            if args.json:
+                if args.batch:
+                    row['query'] = query
+                out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            else:
+                out.write(format_row(row) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
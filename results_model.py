@@ -0,0 +1,113 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor
+
+
+'''
+Модель результатов поиска поверх списка кортежей (block_name, code, name)
+или (block_name, code, name, count) для анализа текста, count - в отдельном столбце.
+Строки отдаются представлению порциями по PAGE_SIZE (canFetchMore/fetchMore),
+сортировка выполняется по самим кортежам. Символы, которых нет в шрифте
+(coverage - GlyphCoverage), показываются серым. Коды вне разделов и неназначенные
+(block_name или name None) выбрать нельзя.
+'''
+
+
+class SearchResultsModel(QAbstractTableModel):
+
+    PAGE_SIZE = 256
+
+    # ключи сортировки по столбцам: раздел, код, символ, название, количество
+    SORT_KEYS = [
+        lambda entry: entry[0] or '',
+        lambda entry: entry[1],
+        lambda entry: entry[1],
+        lambda entry: entry[2] or '',
+        lambda entry: entry[3] if len(entry) > 3 else 0]
+
+    def __init__(self, parent=None):
+        super(SearchResultsModel, self).__init__(parent)
+        self._items = []
+        self._loaded = 0
+        self.coverage = None
+
+    def setResults(self, items):
+        self.beginResetModel()
+        self._items = list(items)
+        self._loaded = min(self.PAGE_SIZE, len(self._items))
+        self.endResetModel()
+
+    # добавление порции результатов, сразу видна только первая страница
+    def appendResults(self, items):
+        self._items.extend(items)
+        count = min(self.PAGE_SIZE, len(self._items)) - self._loaded
+        if count > 0:
+            self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+            self._loaded += count
+            self.endInsertRows()
+
+    def item(self, row):
+        return self._items[row]
+
+    def resultCount(self):
+        return len(self._items)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 5
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._loaded < len(self._items)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(self.PAGE_SIZE, len(self._items) - self._loaded)
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    @staticmethod
+    def isSelectable(entry):
+        return entry[0] is not None and entry[2] is not None
+
+    def flags(self, index):
+        if index.isValid() and not self.isSelectable(self._items[index.row()]):
+            return Qt.NoItemFlags
+        return super(SearchResultsModel, self).flags(index)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._items[index.row()]
+        if role == Qt.ForegroundRole:
+            if self.coverage is not None and not self.coverage.supports(entry[1]):
+                return QColor(Qt.gray)
+            return None
+        column = index.column()
+        if role == Qt.TextAlignmentRole and column == 4:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role != Qt.DisplayRole:
+            return None
+        if column == 0:
+            return entry[0]
+        if column == 1:
+            return ' {:05X}'.format(entry[1])
+        if column == 2:
+            return chr(entry[1])
+        if column == 3:
+            return entry[2]
+        if len(entry) > 3:
+            return '×{0}'.format(entry[3])
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self._items.sort(key=self.SORT_KEYS[column],
+                         reverse=(order == Qt.DescendingOrder))
+        self.layoutChanged.emit()
@@ -1,8 +1,9 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (QAbstractItemView, QComboBox, QDialog, QHBoxLayout,
-                             QVBoxLayout, QHeaderView, QPushButton, QTableWidget,
-                             QTableWidgetItem)
-from data_loader import UnicodeTable
+                             QVBoxLayout, QHeaderView, QPushButton, QTableView)
+from results_model import SearchResultsModel
+from search_worker import SearchWorker
+from instrument import span
 
 
 SEARCH_MODES = [
@@ -10,10 +11,16 @@ SEARCH_MODES = [
     'по названию символа',
     'по символу',
     'по HEX коду',
-    'по DEC коду']
+    'по DEC коду',
+    'по словам, лучшие',
+    'анализ текста']
 
 
 class UnicodeSearch(QDialog):
+
+    # задержка поиска по мере ввода после последнего нажатия, мс
+    SEARCH_DELAY = 300
+
     def __init__(self, parent):
         super(UnicodeSearch, self).__init__(parent)
 
@@ -22,17 +29,25 @@ class UnicodeSearch(QDialog):
         self.selected_item = None
         self.selected_code = -1
         self.recent_searches = []
+        self.block_mode = False
+        self.keep_order = False
+
+        # поиск выполняется в SearchWorker, generation отличает текущий запрос
+        # от устаревших, результаты которых еще могут прийти
+        self.worker = None
+        self.generation = 0
 
         # таблица с результатами поиска
-        self.results = QTableWidget()
+        self.model = SearchResultsModel(self)
+        self.results = QTableView()
+        self.results.setModel(self.model)
         self.results.verticalHeader().hide()
         self.results.horizontalHeader().hide()
         self.results.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        self.results.setColumnCount(4)
         self.results.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
         self.results.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.results.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.results.cellActivated.connect(self.selectItem)
+        self.results.activated.connect(self.selectItem)
 
         # строка поиска, сохраняет введенные ранее строки
         self.combo = QComboBox()
@@ -42,20 +57,37 @@ class UnicodeSearch(QDialog):
         self.combo.currentIndexChanged.connect(self.searchClicked)
         self.search_mode = QComboBox()
         self.search_mode.addItems(SEARCH_MODES)
+
+        # поиск по мере ввода
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.typingSearch)
+        self.combo.editTextChanged.connect(self.scheduleSearch)
+        self.search_mode.currentIndexChanged.connect(self.scheduleSearch)
         self.lang_select = QComboBox()
         self.lang_select.addItems(parent.LANG_STRINGS)
         current_lang_index = parent.LANG_STRINGS.index(parent.table.lang)
         self.lang_select.setCurrentIndex(current_lang_index)
         self.lang_select.currentIndexChanged.connect(self.reloadUT)
-        search_button = QPushButton(parent.search_icon, '')
-        search_button.setToolTip('начать поиск')
-        search_button.clicked.connect(self.searchClicked)
+        # подключены один раз: загрузка может закончиться сразу после запуска
+        parent.tableReady.connect(self.tableLoaded)
+        parent.tableLoadFailed.connect(self.tableFailed)
+        # поиск по названиям сразу на всех языках, результаты на текущем
+        self.all_langs_button = QPushButton('∀')
+        self.all_langs_button.setCheckable(True)
+        self.all_langs_button.setToolTip('искать названия на всех языках')
+        self.all_langs_button.toggled.connect(self.scheduleSearch)
+        self.search_button = QPushButton(parent.search_icon, '')
+        self.search_button.setToolTip('начать поиск')
+        self.search_button.clicked.connect(self.searchClicked)
 
         top_bar = QHBoxLayout()
         top_bar.addWidget(self.combo, 1)
         top_bar.addWidget(self.search_mode)
         top_bar.addWidget(self.lang_select)
-        top_bar.addWidget(search_button)
+        top_bar.addWidget(self.all_langs_button)
+        top_bar.addWidget(self.search_button)
 
         main_box = QVBoxLayout()
         main_box.addLayout(top_bar)
@@ -65,68 +97,130 @@ class UnicodeSearch(QDialog):
         self.resize(680, 680)
         self.searchClicked()
 
-    # перезагрузка имен разделов/символов на указанном языке
+    # перезагрузка имен разделов/символов на указанном языке в фоновом потоке,
+    # до окончания загрузки поиск недоступен
     def reloadUT(self):
-        self.parent.table = UnicodeTable(
-            self.parent.UT_FILENAME,
-            self.lang_select.currentText())
+        self.setSearchEnabled(False)
+        self.setWindowTitle('{0} — загрузка...'.format(self.parent.APP_NAME))
+        self.parent.loadTable(self.lang_select.currentText())
+
+    def tableLoaded(self, table):
+        # результат устаревшего запроса, язык уже сменили
+        if table is not self.parent.table:
+            return
+        self.setSearchEnabled(True)
         self.search_mode.setCurrentIndex(0)
         self.combo.setCurrentText('')
         self.searchClicked()
 
+    # язык не загрузился: в списке снова прежний, поиск по прежней таблице
+    def tableFailed(self, lang_str, message):
+        # ошибка устаревшего запроса, язык уже сменили
+        if lang_str != self.lang_select.currentText():
+            return
+        self.lang_select.blockSignals(True)
+        self.lang_select.setCurrentText(self.parent.table.lang)
+        self.lang_select.blockSignals(False)
+        self.setSearchEnabled(True)
+        self.updateTitle()
+
+    def setSearchEnabled(self, enabled):
+        self.combo.setEnabled(enabled)
+        self.search_mode.setEnabled(enabled)
+        self.all_langs_button.setEnabled(enabled)
+        self.search_button.setEnabled(enabled)
+        self.results.setEnabled(enabled)
+
+    # явный поиск (кнопка, Enter, выбор из списка) сохраняет строку в истории
     def searchClicked(self):
-        items = []
-        ut = self.parent.table
-        self.block_mode = False
         text = self.combo.currentText()
         if text not in self.recent_searches:
             self.recent_searches.append(text)
             self.combo.addItem(text)
-        mode = self.search_mode.currentIndex()
-        if mode == 0:
-            items = ut.find_block_name(text)
-            self.block_mode = True
-        if mode == 1:
-            if len(text) < 3:
-                self.combo.setCurrentText('не меньше 3 букв')
-            else:
-                items = ut.find_symbol_name(text)
-        if mode == 2:
-            items = ut.find_symbols(text)
-        if mode == 3:
-            items = ut.find_codes(text, 16)
-        if mode == 4:
-            items = ut.find_codes(text, 10)
-
-        self.results.setRowCount(0)
-        for entry in items:
-            row = self.results.rowCount()
-            self.results.insertRow(row)
-            self.results.setItem(row, 0, QTableWidgetItem(entry[0]))
-            self.results.setItem(row, 3, QTableWidgetItem(entry[2]))
-            self.results.setItem(row, 1, QTableWidgetItem(' {:05X}'.format(entry[1])))
-            self.results.setItem(row, 2, QTableWidgetItem(chr(entry[1])))
-
-        self.results.sortByColumn(1, Qt.AscendingOrder)
+        if self.search_mode.currentIndex() == 1 and len(text) < 3:
+            self.combo.blockSignals(True)
+            self.combo.setCurrentText('не меньше 3 букв')
+            self.combo.blockSignals(False)
+        self.startSearch(text)
+
+    def scheduleSearch(self):
+        self.search_timer.start()
+
+    def typingSearch(self):
+        self.startSearch(self.combo.currentText())
+
+    # запуск поиска в фоновом потоке, предыдущий запрос отменяется
+    def startSearch(self, text):
+        self.search_timer.stop()
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.generation += 1
 
+        mode = self.search_mode.currentIndex()
+        self.block_mode = mode == 0
+        # результаты поиска по словам упорядочены по качеству совпадения,
+        # анализа текста - по первому появлению символа
+        self.keep_order = mode in (5, 6)
+        # анализ текста без введенной строки - текст из главного окна
+        if mode == 6 and not text:
+            text = self.parent.edit.text()
+        self.model.coverage = None if self.block_mode else self.parent.coverage
+        self.model.setResults([])
+        if mode == 1 and len(text) < 3:
+            self.updateTitle()
+            return
+
+        tables, langs = None, ()
+        if self.all_langs_button.isChecked():
+            tables, langs = self.parent.tables, self.parent.LANG_STRINGS
+        self.worker = SearchWorker(self.parent.table, mode, text, self.generation, self,
+                                   tables, langs)
+        self.worker.found.connect(self.resultsFound)
+        self.worker.done.connect(self.searchDone)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.start()
+
+    def resultsFound(self, generation, items):
+        if generation != self.generation:
+            return
+        with span('search.results.append', count=len(items)):
+            self.model.appendResults(items)
+        self.updateTitle(True)
+
+    def searchDone(self, generation):
+        if generation != self.generation:
+            return
+        self.worker = None
+        if not self.keep_order:
+            with span('search.results.sort', count=self.model.resultCount()):
+                self.model.sort(1, Qt.AscendingOrder)
+        self.updateTitle()
+
+    def updateTitle(self, searching=False):
         if self.block_mode:
-            self.setWindowTitle('{0} — {1} разделов'.format(
-                self.parent.APP_NAME, len(items)))
+            title = '{0} — {1} разделов'
         else:
-            self.setWindowTitle('{0} — {1} символов'.format(
-                self.parent.APP_NAME, len(items)))
+            title = '{0} — {1} символов'
+        if searching:
+            title += '...'
+        self.setWindowTitle(title.format(self.parent.APP_NAME, self.model.resultCount()))
 
     # выбор одной строки из результатов поиска и
     # возвращение в главное окно к выбранной позиции, сохраняемой в закладки
-    def selectItem(self, row, column):
+    def selectItem(self, index):
+        entry = self.model.item(index.row())
+        if not self.model.isSelectable(entry):
+            return
         if self.block_mode:
-            self.selected_item = self.results.item(row, 0).text()
+            self.selected_item = entry[0]
         else:
-            self.selected_item = '{0} ({1})'.format(
-                self.results.item(row, 3).text(), self.results.item(row, 0).text())
-        self.selected_code = int(self.results.item(row, 1).text(), 16)
+            self.selected_item = '{0} ({1})'.format(entry[2], entry[0])
+        self.selected_code = entry[1]
+        if self.worker is not None:
+            self.worker.cancel()
         self.accept()
 
     def keyPressEvent(self, event):
-        if event.key() == Qt.Key_Return:
+        if event.key() == Qt.Key_Return and self.combo.isEnabled():
             self.searchClicked()
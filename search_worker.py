@@ -0,0 +1,82 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+from instrument import span
+
+
+# число лучших результатов в режиме поиска по словам
+RANK_LIMIT = 100
+
+
+# результаты поиска в режиме mode (индекс в SEARCH_MODES из search_dialog) по одному;
+# если заданы tables (TableManager) и langs, названия ищутся на всех языках langs.
+# Режимы, которым нужны все данные до первого результата, прерываются по cancelled().
+# Анализ текста дает (раздел, код, название, количество), раздел None - код
+# вне разделов, название None - неназначенный код
+def search_items(table, mode, text, tables=None, langs=(), cancelled=None):
+    if tables is not None and mode == 0:
+        return tables.find_block_name_all(text, table.lang, langs, cancelled)
+    if tables is not None and mode == 1:
+        return tables.iter_symbol_name_all(text, table.lang, langs)
+    if mode == 0:
+        return table.iter_block_name(text)
+    if mode == 1:
+        return table.iter_symbol_name(text)
+    if mode == 2:
+        return table.iter_symbols(text)
+    if mode == 3:
+        return table.iter_codes(text, 16)
+    if mode == 4:
+        return table.iter_codes(text, 10)
+    if mode == 5:
+        return table.rank_symbol_name(text, RANK_LIMIT, cancelled=cancelled)
+    if mode == 6:
+        return ((block_name, code, name, count)
+                for code, block_name, name, count in table.analyze_text(text))
+    return []
+
+
+'''
+Выполняет поиск в отдельном потоке и отдает найденное порциями
+по CHUNK_SIZE (сигнал found). Запрос generation, отмененный через cancel(),
+прекращается после текущей порции.
+'''
+
+
+class SearchWorker(QThread):
+
+    CHUNK_SIZE = 256
+
+    found = pyqtSignal(int, object)
+    done = pyqtSignal(int)
+
+    def __init__(self, table, mode, text, generation, parent, tables=None, langs=()):
+        super(SearchWorker, self).__init__(parent)
+        self.table = table
+        self.mode = mode
+        self.text = text
+        self.generation = generation
+        self.tables = tables
+        self.langs = langs
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def run(self):
+        with span('search', mode=self.mode, query=self.text):
+            chunk = []
+            for entry in search_items(self.table, self.mode, self.text,
+                                      self.tables, self.langs, self.isCancelled):
+                if self._cancelled:
+                    return
+                chunk.append(entry)
+                if len(chunk) == self.CHUNK_SIZE:
+                    self.found.emit(self.generation, chunk)
+                    chunk = []
+        if self._cancelled:
+            return
+        if chunk:
+            self.found.emit(self.generation, chunk)
+        self.done.emit(self.generation)
@@ -0,0 +1,29 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+from instrument import profile_thread
+
+
+'''
+Загружает таблицу UnicodeTable на указанном языке через TableManager
+в отдельном потоке, чтобы не блокировать окно.
+'''
+
+
+class TableLoader(QThread):
+
+    loaded = pyqtSignal(object)
+    # язык, сообщение об ошибке
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, tables, lang_str, parent):
+        super(TableLoader, self).__init__(parent)
+        self.tables = tables
+        self.lang = lang_str
+
+    def run(self):
+        try:
+            with profile_thread():
+                table = self.tables.get(self.lang)
+        except Exception as e:
+            self.failed.emit(self.lang, str(e))
+        else:
+            self.loaded.emit(table)